@@ -0,0 +1,116 @@
+"""Micro-benchmark da análise de extract_info_multi_engine.
+
+Compara o pipeline de extratores (server.analysis_pipeline) com a implementação
+anterior (várias passadas, .lower() repetido, regex sem compilar) sobre
+resultados sintéticos e confere que a saída é idêntica.
+
+Uso: python -m benchmarks.bench_analysis [--results 3000] [--rounds 20]
+"""
+import argparse
+import random
+import re
+import time
+
+from benchmarks.common import URLS, WORDS
+from server import analysis_pipeline
+
+
+def make_results(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    return [{
+        "engine": rng.choice(["DuckDuckGo", "Bing", "Google"]),
+        "title": " ".join(rng.choice(WORDS) for _ in range(8)).title(),
+        "snippet": " ".join(rng.choice(WORDS) for _ in range(40)),
+        "url": rng.choice(URLS),
+    } for _ in range(count)]
+
+
+def legacy_analysis(all_results):
+    """Análise anterior, mantida aqui apenas como referência de desempenho e saída"""
+    all_text = ""
+    for r in all_results:
+        all_text += " " + r['title'].lower() + " " + r['snippet'].lower()
+
+    processos = []
+    processo_count = 0
+    for pattern in [r'(\d+)\s*processo[s]?', r'(\d{7}-\d{2}\.\d{4}\.\d\.\d{2}\.\d{4})']:
+        for match in re.findall(pattern, all_text):
+            if isinstance(match, str) and match.isdigit():
+                num = int(match)
+                if 0 < num < 1000 and num > processo_count:
+                    processo_count = num
+    for result in all_results:
+        text = result['title'] + " " + result['snippet']
+        if any(word in text.lower() for word in ['processo', 'tribunal', 'juiz', 'ação', 'sentença']):
+            processos.append({"type": "Processo Judicial", "title": result['title'][:250], "description": result['snippet'][:400], "source": result['engine'], "url": result['url']})
+    if processo_count > 0:
+        processos.insert(0, {"type": "📊 RESUMO", "title": f"⚖️ {processo_count} PROCESSO(S) IDENTIFICADO(S)", "description": f"Total: {len(processos)} registros encontrados", "source": "Análise Multi-Engine"})
+
+    empresas = []
+    for cnpj in list(set(re.findall(r'\d{2}\.?\d{3}\.?\d{3}[/]?\d{4}[-]?\d{2}', all_text)))[:10]:
+        empresas.append({"type": "🏢 CNPJ", "company": f"CNPJ: {cnpj}", "cnpj": cnpj, "source": "Multi-Engine"})
+    for result in all_results:
+        text = result['title'] + " " + result['snippet']
+        if any(word in text.lower() for word in ['cnpj', 'empresa', 'sócio', 'mei', 'ltda']):
+            empresas.append({"type": "💼 Vínculo Empresarial", "company": result['title'][:200], "details": result['snippet'][:300], "source": result['engine'], "url": result['url']})
+
+    social_media = []
+    for username in set(re.findall(r'linkedin\.com/in/([\w-]+)', all_text)[:5]):
+        social_media.append({"platform": "💼 LinkedIn", "profile": username, "url": f"https://www.linkedin.com/in/{username}", "status": "Perfil encontrado"})
+    for username in set(re.findall(r'facebook\.com/([\w.]+)', all_text)[:5]):
+        if username not in ['pages', 'groups', 'watch', 'share']:
+            social_media.append({"platform": "📘 Facebook", "profile": username, "url": f"https://www.facebook.com/{username}", "status": "Perfil encontrado"})
+    for username in set(re.findall(r'instagram\.com/([\w.]+)', all_text)[:5]):
+        if username not in ['explore', 'p', 'reel']:
+            social_media.append({"platform": "📷 Instagram", "profile": f"@{username}", "url": f"https://www.instagram.com/{username}", "status": "Perfil encontrado"})
+
+    family_info = []
+    family_keywords = {'filho': '👦 Filho', 'filha': '👧 Filha', 'pai': '👨 Pai', 'mãe': '👩 Mãe', 'esposa': '💑 Esposa', 'irmão': '👬 Irmão', 'irmã': '👭 Irmã'}
+    for result in all_results:
+        text = result['title'] + " " + result['snippet']
+        for keyword, tipo in family_keywords.items():
+            if keyword in text.lower():
+                family_info.append({"type": tipo, "details": result['snippet'][:250], "source": result['engine']})
+                if len(family_info) >= 8: break
+        if len(family_info) >= 8: break
+
+    public_records = []
+    for result in all_results[:30]:
+        categoria = "📋 Menção"
+        if any(w in result['url'].lower() for w in ['g1.com', 'uol.com', 'folha', 'estadao', 'globo']):
+            categoria = "📰 Notícia"
+        elif any(w in result['snippet'].lower() for w in ['atleta', 'esporte', 'competição', 'campeonato']):
+            categoria = "🏃 Esporte"
+        public_records.append({"source": categoria, "title": result['title'][:200], "snippet": result['snippet'][:350], "url": result['url'], "engine": result['engine']})
+
+    return {"processos": processos, "processo_count": processo_count, "empresas": empresas, "social_media": social_media, "public_records": public_records, "family_info": family_info}
+
+
+def best_of(fn, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    results = make_results(args.results)
+    assert analysis_pipeline.run(results) == legacy_analysis(results), "saída do pipeline difere da análise anterior"
+
+    legacy = best_of(lambda: legacy_analysis(results), args.rounds)
+    pipeline = best_of(lambda: analysis_pipeline.run(results), args.rounds)
+    print(f"resultados: {args.results}")
+    print(f"análise anterior: {legacy * 1000:8.2f} ms")
+    print(f"pipeline:         {pipeline * 1000:8.2f} ms")
+    print(f"speedup:          {legacy / pipeline:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
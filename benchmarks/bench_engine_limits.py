@@ -0,0 +1,116 @@
+"""Taxa global de requisições aos motores com N processos de API.
+
+Sobe N processos, cada um com seu MultiSearchEngine, disparando fetch() contra
+o stub_serp o mais rápido que os limites permitem. O stub registra a chegada
+de cada requisição e o relatório mostra a taxa observada por motor conforme
+processos são adicionados: com ENGINE_LIMITS_BACKEND=mongo ela deve ficar em
+ENGINE_RATE_PER_SEC e a concorrência em ENGINE_MAX_CONCURRENCY; com 'local'
+ambas se multiplicam por N. O backend mongo precisa de um MongoDB real
+(--mongo-url), compartilhado pelos processos.
+
+Uso: python -m benchmarks.bench_engine_limits [--backend mongo] [--mongo-url mongodb://localhost:27017]
+                                              [--workers 1,2,4] [--duration 10] [--rate 5] [--burst 5]
+                                              [--concurrency 2] [--latency-ms 100]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+DB_NAME = "verificapessoa_bench_limits"
+
+
+def worker_main(args, address: str, start_at: float, index: int):
+    # Lidos na importação do server
+    os.environ["ENGINE_LIMITS_BACKEND"] = args.backend
+    os.environ["ENGINE_RATE_PER_SEC"] = str(args.rate)
+    os.environ["ENGINE_BURST"] = str(args.burst)
+    os.environ["ENGINE_MAX_CONCURRENCY"] = str(args.concurrency)
+    os.environ["LOG_LEVEL"] = "WARNING"
+    import server
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from benchmarks.stub_serp import StubTransport
+
+    async def run():
+        if args.backend == "mongo":
+            server.db = AsyncIOMotorClient(args.mongo_url, serverSelectionTimeoutMS=5000)[DB_NAME]
+        await server.search_system.limiter.setup()
+        server.search_system.transport = StubTransport(address)
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        deadline = time.time() + args.duration
+        sequence = 0
+
+        async def fire(engine: str, url: str):
+            nonlocal sequence
+            while time.time() < deadline:
+                sequence += 1
+                try:
+                    await server.search_system.fetch(engine, url.format(q=f"p{index}-{sequence}"))
+                except Exception:
+                    pass
+
+        # Mais tarefas que vagas: a fila fica sempre cheia e quem limita são os limites
+        await asyncio.gather(*(fire(engine, url) for engine, url in (("DuckDuckGo", "https://html.duckduckgo.com/html/?q={q}"),
+                                                                     ("Bing", "https://www.bing.com/search?q={q}"))
+                               for _ in range(args.concurrency * 2)))
+        await server.search_system.close()
+
+    asyncio.run(run())
+
+
+def observed_rate(arrivals, burst: int) -> float:
+    """Requisições/s em regime, descontando a rajada inicial do bucket"""
+    if len(arrivals) <= burst + 1:
+        return 0.0
+    steady = arrivals[burst:]
+    return (len(steady) - 1) / (steady[-1] - steady[0])
+
+
+def reset_limits(args):
+    if args.backend == "mongo":
+        from pymongo import MongoClient
+        MongoClient(args.mongo_url, serverSelectionTimeoutMS=5000)[DB_NAME].engine_limits.delete_many({})
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("mongo", "local"), default="mongo")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--workers", default="1,2,4", help="números de processos a comparar")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--rate", type=float, default=5, help="ENGINE_RATE_PER_SEC")
+    parser.add_argument("--burst", type=int, default=5, help="ENGINE_BURST")
+    parser.add_argument("--concurrency", type=int, default=2, help="ENGINE_MAX_CONCURRENCY")
+    parser.add_argument("--latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    from benchmarks.stub_serp import StubConfig, StubSerpServer
+
+    print(f"backend {args.backend}: limite {args.rate:g} req/s (rajada {args.burst}) e {args.concurrency} simultâneas por motor")
+    print(f"{'processos':>9} {'motor':>11} {'requisições':>12} {'req/s':>8} {'esperado':>9} {'simultâneas':>12}")
+    ok = True
+    context = multiprocessing.get_context("spawn")
+    for workers in (int(n) for n in args.workers.split(",")):
+        reset_limits(args)
+        stub = StubSerpServer(StubConfig(latency_ms=args.latency_ms, jitter=0.2, page_kb=4)).start()
+        start_at = time.time() + 3 + workers * 0.5
+        processes = [context.Process(target=worker_main, args=(args, stub.address, start_at, i)) for i in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        stub.stop()
+        scale = workers if args.backend == "local" else 1
+        for engine in ("DuckDuckGo", "Bing"):
+            rate = observed_rate(stub.arrivals[engine], args.burst * scale)
+            peak = stub.peak_active[engine]
+            print(f"{workers:>9} {engine:>11} {stub.requests[engine]:>12} {rate:>8.2f} {args.rate * scale:>9.2f} {peak:>12}")
+            ok = ok and rate <= args.rate * scale * 1.1 and peak <= args.concurrency * scale
+    print("\ntaxa global dentro do limite" if ok else "\nTAXA ACIMA DO LIMITE")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
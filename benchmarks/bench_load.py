@@ -0,0 +1,167 @@
+"""Teste de carga ponta a ponta da API, totalmente offline.
+
+A API roda no mesmo processo (httpx.ASGITransport) sobre o mongomock-motor no
+lugar do MongoDB, e os motores de busca são respondidos pelo stub_serp, com
+latência e erros configuráveis. Workers concorrentes executam uma mistura de
+POST /api/search, POST /api/auth/login e endpoints admin, e o relatório traz
+p50/p95/p99 e requisições/s por endpoint.
+
+Uso: python -m benchmarks.bench_load [--duration 20] [--concurrency 20] [--users 20] [--names 40]
+                                     [--latency-ms 150] [--error-rate 0] [--captcha-rate 0] [--fixtures DIR | --synthetic]
+                                     [--mix search=6,login=2,admin=2] [--bcrypt-rounds 10] [--engine-rate 50]
+                                     [--save out.json] [--baseline base.json] [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import add_report_arguments, finish, print_table, summarize
+
+ADMIN_PATHS = ["/api/admin/stats", "/api/admin/users?limit=50", "/api/admin/searches?limit=50", "/api/admin/transactions?limit=50"]
+FIRST_NAMES = ["Joao", "Maria", "Ana", "Pedro", "Lucas", "Julia", "Carlos", "Fernanda", "Rafael", "Beatriz"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa", "Almeida"]
+
+
+def parse_mix(value: str):
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - {"search", "login", "admin"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+    return weights
+
+
+class LoadTest:
+    def __init__(self, args, server):
+        self.args = args
+        self.server = server
+        self.rng = random.Random(args.seed)
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.names = [f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {i}" for i in range(args.names)]
+        self.users = []
+
+    async def call(self, http: httpx.AsyncClient, label: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await http.request(method, path, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.samples[label].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[label] += 1
+        return response
+
+    async def setup(self, http: httpx.AsyncClient):
+        for i in range(self.args.users):
+            email, password = f"carga{i}@example.com", f"senha-{i}"
+            await http.post("/api/auth/register", json={"email": email, "password": password})
+            await http.post("/api/admin/add-credits", json={"email": email, "credits": 1_000_000})
+            token = (await http.post("/api/auth/login", json={"email": email, "password": password})).json()["token"]
+            self.users.append((email, password, {"Authorization": f"Bearer {token}"}))
+
+    async def worker(self, http: httpx.AsyncClient, deadline: float):
+        scenarios, weights = zip(*self.args.mix.items())
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(scenarios, weights)[0]
+            email, password, headers = self.rng.choice(self.users)
+            if scenario == "search":
+                await self.call(http, "POST /api/search", "POST", "/api/search", headers=headers,
+                                json={"name": self.rng.choice(self.names), "force_refresh": self.rng.random() < self.args.refresh_rate})
+            elif scenario == "login":
+                await self.call(http, "POST /api/auth/login", "POST", "/api/auth/login", json={"email": email, "password": password})
+            else:
+                path = self.rng.choice(ADMIN_PATHS)
+                await self.call(http, f"GET {path.split('?')[0]}", "GET", path)
+
+    async def run(self):
+        from mongomock_motor import AsyncMongoMockClient
+        from benchmarks.stub_serp import SERP_FIXTURES, StubConfig, StubSerpServer, StubTransport
+
+        server = self.server
+        stub = StubSerpServer(StubConfig(latency_ms=self.args.latency_ms, error_rate=self.args.error_rate,
+                                         captcha_rate=self.args.captcha_rate, page_kb=self.args.page_kb,
+                                         fixtures=None if self.args.synthetic else self.args.fixtures or SERP_FIXTURES,
+                                         seed=self.args.seed)).start()
+        server.search_system.transport = StubTransport(stub.address, limits=server.search_system.limits)
+        await server.init_database(AsyncMongoMockClient()[server.DB_NAME])
+        transport = httpx.ASGITransport(app=server.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+                await self.setup(http)
+                self.samples.clear()
+                self.errors.clear()
+                started = time.perf_counter()
+                deadline = started + self.args.duration
+                await asyncio.gather(*(self.worker(http, deadline) for _ in range(self.args.concurrency)))
+                elapsed = time.perf_counter() - started
+        finally:
+            await server.hot_refresher.stop()
+            await server.search_jobs.stop()
+            await server.search_system.close()
+            stub.stop()
+        return elapsed, stub
+
+    def report(self, elapsed: float):
+        report = {label: summarize(samples, self.errors[label], elapsed) for label, samples in sorted(self.samples.items())}
+        report["total"] = summarize([s for samples in self.samples.values() for s in samples], sum(self.errors.values()), elapsed)
+        return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--names", type=int, default=40, help="nomes distintos buscados (menos nomes = mais acertos de cache)")
+    parser.add_argument("--refresh-rate", type=float, default=0.1, help="fração das buscas com force_refresh")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("search=6,login=2,admin=2"))
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    parser.add_argument("--fixtures", type=Path, help="diretório com HTML gravado (padrão: tests/fixtures/serp)")
+    parser.add_argument("--synthetic", action="store_true", help="páginas sintéticas no lugar do HTML gravado")
+    parser.add_argument("--page-kb", type=int, default=60, help="tamanho das páginas sintéticas")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10, help="custo do bcrypt (produção usa BCRYPT_ROUNDS)")
+    parser.add_argument("--engine-rate", type=float, default=50, help="requisições/s por motor (produção usa ENGINE_RATE_PER_SEC)")
+    parser.add_argument("--engine-concurrency", type=int, default=8, help="produção usa ENGINE_MAX_CONCURRENCY")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="WARNING", help="nível dos logs da API durante o teste")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+
+    # Lidos na importação do server (stub_serp também importa o server: só dentro de run())
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["ENGINE_RATE_PER_SEC"] = str(args.engine_rate)
+    os.environ["ENGINE_BURST"] = str(max(1, int(args.engine_rate)))
+    os.environ["ENGINE_MAX_CONCURRENCY"] = str(args.engine_concurrency)
+    os.environ["LOG_LEVEL"] = args.log_level
+    import server
+
+    test = LoadTest(args, server)
+    elapsed, stub = asyncio.run(test.run())
+
+    report = test.report(elapsed)
+    print(f"duração: {elapsed:.1f}s, concorrência: {args.concurrency}, latência do stub: {args.latency_ms:.0f} ms, "
+          f"erros injetados: {args.error_rate:.0%}, captchas: {args.captcha_rate:.0%}")
+    print(f"requisições aos motores: {stub.requests}")
+    print(f"cache de SERP: {server.search_system.serp_cache.get_stats()['engines']}")
+    print_table("carga por endpoint (/s = requisições por segundo)", report)
+    print("\nsaúde dos motores:")
+    for engine, stats in server.search_system.get_engine_stats().items():
+        print(f"  {engine:11} {stats['state']:9} sucesso {stats['success_rate']:.0%}  p95 {stats['latency_ms']['p95']} ms  timeout {stats['timeout_seconds']}s")
+    return finish(report, args.save, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Micro-benchmarks das etapas da busca e da autenticação, sem rede.
+
+Mede o parse de SERP de cada motor (HTML gravado em tests/fixtures/serp ou
+páginas sintéticas do stub_serp), a canonicalização + mescla e a análise de extract_info_multi_engine
+sobre as 6 queries de uma busca, bcrypt (hash e verificação) e JWT
+(emissão e validação).
+
+Uso: python -m benchmarks.bench_micro [--rounds 50] [--bcrypt-rounds 10] [--fixtures DIR | --synthetic]
+                                      [--save out.json] [--baseline base.json] [--tolerance 0.2]
+"""
+import argparse
+import itertools
+import sys
+from pathlib import Path
+
+import jwt
+
+import server
+from benchmarks.common import add_report_arguments, finish, print_table, summarize, timed
+from benchmarks.stub_serp import RENDERERS, SERP_FIXTURES, load_fixtures, synthetic_page
+
+QUERIES = [f'"{name}"{suffix}' for name in ("Joao Silva",) for suffix in
+           ("", " Brasil", " processos judiciais", " CNPJ empresa", " LinkedIn", " redes sociais")]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10, help="custo do bcrypt (produção usa BCRYPT_ROUNDS)")
+    parser.add_argument("--fixtures", type=Path, default=SERP_FIXTURES, help="diretório com HTML gravado (duckduckgo*.html, bing*.html, google*.html)")
+    parser.add_argument("--synthetic", action="store_true", help="páginas sintéticas no lugar do HTML gravado")
+    parser.add_argument("--page-kb", type=int, default=60, help="tamanho das páginas sintéticas")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+
+    fixtures = None if args.synthetic else load_fixtures(args.fixtures)
+    pages = {engine: (fixtures[engine] if fixtures else [synthetic_page(engine, q, args.page_kb) for q in QUERIES]) for engine in RENDERERS}
+    report = {}
+
+    for engine, engine_pages in pages.items():
+        parser_fn = server.SERP_PARSERS[engine]
+        samples = timed(lambda: [parser_fn(p) for p in engine_pages], args.rounds)
+        report[f"parse {engine}"] = summarize([s / len(engine_pages) for s in samples])
+
+    batches = [(q, server.SERP_PARSERS[engine](page)) for engine in ("DuckDuckGo", "Bing") for q, page in zip(QUERIES, itertools.cycle(pages[engine]))]
+
+    def merge():
+        merger = server.SerpResultMerger()
+        for query, results in batches:
+            merger.add(query, results)
+        return merger
+
+    report["canonicalização + mescla"] = summarize(timed(merge, args.rounds))
+    merged = merge()
+    report["análise (pipeline)"] = summarize(timed(lambda: server.analysis_pipeline.run(merged.results), args.rounds))
+
+    hashed = server.hash_password("senha-de-teste", args.bcrypt_rounds)
+    bcrypt_rounds = max(3, args.rounds // 10)
+    report[f"bcrypt hash ({args.bcrypt_rounds})"] = summarize(timed(lambda: server.hash_password("senha-de-teste", args.bcrypt_rounds), bcrypt_rounds))
+    report[f"bcrypt verify ({args.bcrypt_rounds})"] = summarize(timed(lambda: server.verify_password("senha-de-teste", hashed), bcrypt_rounds))
+
+    user = {"_id": "bench-user", "email": "bench@example.com"}
+    token = server.create_jwt_token(user)
+    report["jwt emissão"] = summarize(timed(lambda: server.create_jwt_token(user), args.rounds * 20))
+    report["jwt validação"] = summarize(timed(lambda: jwt.decode(token, server.JWT_SECRET, algorithms=["HS256"]), args.rounds * 20))
+
+    for s in report.values():
+        s["per_sec"] = round(1000 / s["p50_ms"], 1) if s["p50_ms"] else 0.0
+    print(f"resultados brutos: {merged.received}, únicos após mescla: {len(merged.results)}")
+    print_table("micro-benchmarks (por operação; /s = 1 / p50)", report)
+    return finish(report, args.save, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
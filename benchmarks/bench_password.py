@@ -0,0 +1,60 @@
+"""Benchmark de verificação de senha sob concorrência.
+
+Compara bcrypt executado direto no event loop (comportamento anterior de
+login_user) com o PasswordHasher (pool dedicado). Mede logins/s e o maior
+atraso observado por uma tarefa periódica no event loop, que representa as
+demais requisições (health check, buscas) durante uma rajada de logins.
+
+Uso: python -m benchmarks.bench_password [--logins 40] [--workers 4] [--rounds 10]
+"""
+import argparse
+import asyncio
+import time
+
+from server import PasswordHasher, hash_password, verify_password
+
+
+async def measure(verify, logins: int):
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - start - 0.005)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    return logins / elapsed, lag
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    hashed = hash_password("senha-de-teste", args.rounds)
+    hasher = PasswordHasher(args.workers, args.logins, args.rounds)
+
+    async def inline():
+        return verify_password("senha-de-teste", hashed)
+
+    async def pooled():
+        return await hasher.verify("senha-de-teste", hashed)
+
+    print(f"logins concorrentes: {args.logins}, custo bcrypt: {args.rounds}, workers: {args.workers}")
+    for label, verify in (("no event loop", inline), ("pool dedicado", pooled)):
+        throughput, lag = await measure(verify, args.logins)
+        print(f"{label:14} {throughput:8.1f} logins/s   atraso máximo do loop: {lag * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
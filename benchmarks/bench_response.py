@@ -0,0 +1,131 @@
+"""Benchmark de serialização e compressão da resposta de /api/search.
+
+Gera uma resposta real de search_person (motores respondidos pelo stub_serp)
+e compara, por resposta: jsonable_encoder + json.dumps (caminho padrão do
+FastAPI) contra orjson, o tamanho bruto/gzip/brotli, e o efeito de
+?fields=legal_records,professional. Também mede ponta a ponta (ASGI) a pilha
+anterior (middleware CORS próprio + CORSMiddleware + JSONResponse) contra a
+atual (CORSMiddleware + CompressionMiddleware + FastJSONResponse).
+
+Uso: python -m benchmarks.bench_response [--rounds 200] [--requests 300]
+"""
+import argparse
+import asyncio
+import json
+import time
+import zlib
+
+import brotli
+import httpx
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.middleware.cors import CORSMiddleware
+
+import server
+from benchmarks.stub_serp import StubConfig, StubSerpServer, StubTransport
+
+CORS_OPTIONS = dict(allow_origins=["*"], allow_credentials=True, allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+                    allow_headers=["*"], expose_headers=["*"], max_age=3600)
+
+
+async def sample_payload():
+    stub = StubSerpServer(StubConfig(latency_ms=0, jitter=0)).start()
+    server.search_system.transport = StubTransport(stub.address)
+    try:
+        results = await server.search_system.search_person(name="Joao Silva")
+    finally:
+        await server.search_system.close()
+        stub.stop()
+    return {**results, "cache": {"hit": False, "age_seconds": 0, "cached_at": results["timestamp"]}}
+
+
+def cpu_per_call(fn, rounds: int) -> float:
+    start = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - start) / rounds * 1000
+
+
+def legacy_app(payload) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def add_cors_headers(request, call_next):
+        response = await call_next(request)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
+        response.headers["Access-Control-Allow-Headers"] = "*"
+        return response
+
+    app.add_middleware(CORSMiddleware, **CORS_OPTIONS)
+
+    @app.get("/search")
+    async def search():
+        return payload
+    return app
+
+
+def current_app(payload) -> FastAPI:
+    app = FastAPI(default_response_class=server.FastJSONResponse)
+    app.add_middleware(server.CompressionMiddleware)
+    app.add_middleware(CORSMiddleware, **CORS_OPTIONS)
+
+    @app.get("/search")
+    async def search():
+        return server.FastJSONResponse(payload)
+    return app
+
+
+async def end_to_end(app: FastAPI, requests: int, accept_encoding: str):
+    headers = {"Origin": "https://verificapessoa.com", "Accept-Encoding": accept_encoding}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+        await http.get("/search", headers=headers)
+        wire = 0
+        start_cpu, start = time.process_time(), time.perf_counter()
+        for _ in range(requests):
+            response = await http.get("/search", headers=headers)
+            wire += len(response.content) if "content-encoding" not in response.headers else int(response.headers["content-length"])
+        return (time.process_time() - start_cpu) / requests * 1000, (time.perf_counter() - start) / requests * 1000, wire // requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    payload = asyncio.run(sample_payload())
+    partial = server.select_fields(payload, server.parse_fields("legal_records,professional"))
+
+    def legacy_encode(content):
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    raw = server.FastJSONResponse(payload).body
+    print(f"resposta de exemplo: {payload['profiles_found']} resultados, {len(raw) / 1024:.1f} KiB de JSON")
+
+    print("\nserialização (CPU por resposta)")
+    print(f"  jsonable_encoder + json.dumps  {cpu_per_call(lambda: legacy_encode(payload), args.rounds):8.3f} ms")
+    print(f"  orjson (FastJSONResponse)      {cpu_per_call(lambda: server.FastJSONResponse(payload), args.rounds):8.3f} ms")
+
+    print("\ntamanho e CPU de compressão por resposta")
+    for label, body in (("completa", raw), ("fields=legal_records,professional", server.FastJSONResponse(partial).body)):
+        gz = zlib.compressobj(server.GZIP_LEVEL, zlib.DEFLATED, 31)
+        gzipped = gz.compress(body) + gz.flush()
+        br = brotli.compress(body, quality=server.BROTLI_QUALITY)
+        gzip_ms = cpu_per_call(lambda: server.StreamCompressor("gzip").finish(body), args.rounds)
+        br_ms = cpu_per_call(lambda: server.StreamCompressor("br").finish(body), args.rounds)
+        print(f"  {label:34} bruto {len(body) / 1024:7.1f} KiB | gzip {len(gzipped) / 1024:6.1f} KiB ({gzip_ms:.3f} ms)"
+              f" | br {len(br) / 1024:6.1f} KiB ({br_ms:.3f} ms)")
+
+    print("\nponta a ponta via ASGI (CPU e tempo por requisição, bytes trafegados)")
+    for label, app, encoding in (("anterior", legacy_app(payload), "identity"),
+                                 ("atual, sem compressão", current_app(payload), "identity"),
+                                 ("atual, gzip", current_app(payload), "gzip"),
+                                 ("atual, br", current_app(payload), "br")):
+        cpu, wall, wire = asyncio.run(end_to_end(app, args.requests, encoding))
+        print(f"  {label:24} CPU {cpu:7.3f} ms  tempo {wall:7.3f} ms  {wire / 1024:7.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Utilitários compartilhados pelos benchmarks: percentis, relatório, comparação com baseline e dados sintéticos."""
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Vocabulário dos resultados sintéticos (bench_analysis e páginas --synthetic do stub_serp)
+WORDS = (
+    "silva santos processo tribunal juiz ação sentença empresa cnpj sócio ltda mei filho filha pai mãe "
+    "esposa irmão irmã atleta campeonato competição notícia brasil são paulo rio de janeiro cidade prefeitura "
+    "linkedin.com/in/joao-silva facebook.com/joao.silva instagram.com/joaosilva 12.345.678/0001-90 3 processos"
+).split()
+URLS = ["https://g1.globo.com/noticia", "https://www.uol.com.br/x", "https://www.jusbrasil.com.br/processos",
+        "https://www.linkedin.com/in/joao", "https://exemplo.com.br/pagina", "https://cnpj.biz/123"]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples: List[float], errors: int = 0, elapsed: Optional[float] = None) -> Dict[str, float]:
+    """Resumo em ms de uma lista de durações em segundos"""
+    summary = {
+        "count": len(samples),
+        "errors": errors,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+    }
+    if elapsed:
+        summary["per_sec"] = round(len(samples) / elapsed, 1)
+    return summary
+
+
+def timed(fn, rounds: int) -> List[float]:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]):
+    print(f"\n{title}")
+    print(f"{'':28} {'n':>7} {'erros':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'/s':>9}")
+    for name, s in rows.items():
+        print(f"{name:28} {s['count']:>7} {s['errors']:>6} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s.get('per_sec', 0):>9.1f}")
+
+
+def save_report(path: Path, report: Dict[str, Dict[str, float]]):
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def compare_with_baseline(path: Path, report: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Linhas cujo p95 piorou mais que `tolerance` (fração) em relação ao baseline salvo"""
+    baseline = json.loads(path.read_text(encoding="utf-8"))
+    regressions = []
+    for name, current in report.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("p95_ms"):
+            continue
+        change = current["p95_ms"] / previous["p95_ms"] - 1
+        if change > tolerance:
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms (+{change:.0%})")
+    return regressions
+
+
+def finish(report: Dict[str, Dict[str, float]], save: Optional[Path], baseline: Optional[Path], tolerance: float) -> int:
+    """Salva/compara o relatório; código de saída 1 se houver regressão"""
+    if save:
+        save_report(save, report)
+        print(f"\nrelatório salvo em {save}")
+    if baseline:
+        regressions = compare_with_baseline(baseline, report, tolerance)
+        if regressions:
+            print(f"\nREGRESSÕES (tolerância {tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nsem regressões em relação a {baseline} (tolerância {tolerance:.0%})")
+    return 0
+
+
+def add_report_arguments(parser):
+    parser.add_argument("--save", type=Path, help="grava o relatório em JSON")
+    parser.add_argument("--baseline", type=Path, help="compara com um relatório salvo e sai com 1 se o p95 piorar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="piora aceitável do p95 (fração)")
@@ -0,0 +1,195 @@
+"""Servidor local que responde no lugar de DuckDuckGo, Bing e Google.
+
+Por padrão reproduz o HTML gravado em tests/fixtures/serp (duckduckgo*.html,
+bing*.html, google*.html; blocked-<motor>.html nas respostas de CAPTCHA); outro
+diretório pode ser passado em fixtures, e fixtures=None gera páginas sintéticas
+no formato de cada motor. Latência e injeção de erros são configuráveis. O StubTransport redireciona as requisições do
+MultiSearchEngine para este servidor mantendo o cabeçalho Host original, de
+modo que fetch/parse/cache/circuit breaker rodam exatamente como em produção.
+"""
+import hashlib
+import random
+import threading
+import time
+from dataclasses import dataclass
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+import httpx
+
+from benchmarks.common import URLS, WORDS
+
+ENGINE_HOSTS = {"html.duckduckgo.com": "DuckDuckGo", "www.bing.com": "Bing", "www.google.com": "Google"}
+SERP_FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "serp"
+CAPTCHA_PAGE = "<html><body><h1>Our systems have detected unusual traffic from your computer network.</h1></body></html>"
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 150.0
+    jitter: float = 0.5
+    error_rate: float = 0.0
+    captcha_rate: float = 0.0
+    page_kb: int = 60
+    fixtures: Optional[Path] = SERP_FIXTURES
+    seed: int = 42
+
+
+def synthetic_results(query: str, count: int = 25) -> List[Dict[str, str]]:
+    """Resultados determinísticos por query; motores diferentes recebem fatias sobrepostas"""
+    rng = random.Random(hashlib.sha256(query.encode("utf-8")).digest())
+    return [{
+        "title": " ".join(rng.choice(WORDS) for _ in range(8)).title(),
+        "snippet": " ".join(rng.choice(WORDS) for _ in range(40)),
+        "url": f"{rng.choice(URLS)}/{rng.randint(1, 40)}",
+    } for _ in range(count)]
+
+
+def _padding(page_kb: int) -> str:
+    # Páginas reais são dominadas por scripts e estilos inline
+    return f"<script>var _pad = '{'x' * max(0, page_kb * 1024 - 2048)}';</script>"
+
+
+def render_duckduckgo(results, page_kb: int) -> str:
+    items = "".join(
+        f'<div class="result results_links"><h2 class="result__title">'
+        f'<a class="result__a" href="//duckduckgo.com/l/?uddg={quote(r["url"], safe="")}&amp;rut=abc">{escape(r["title"])}</a></h2>'
+        f'<a class="result__snippet" href="#">{escape(r["snippet"])}</a></div>'
+        for r in results[:20])
+    return f"<html><head>{_padding(page_kb)}</head><body><div id=\"links\">{items}</div></body></html>"
+
+
+def render_bing(results, page_kb: int) -> str:
+    items = "".join(
+        f'<li class="b_algo"><h2><a href="{escape(r["url"])}?utm_source=bing">{escape(r["title"])}</a></h2>'
+        f'<div class="b_caption"><p>{escape(r["snippet"])}</p></div></li>'
+        for r in results[5:25])
+    return f"<html><head>{_padding(page_kb)}</head><body><ol id=\"b_results\">{items}</ol></body></html>"
+
+
+def render_google(results, page_kb: int) -> str:
+    items = "".join(
+        f'<div class="g"><a href="/url?q={quote(r["url"], safe="")}&amp;sa=U"><h3>{escape(r["title"])}</h3></a>'
+        f'<div class="VwiC3b">{escape(r["snippet"])}</div></div>'
+        for r in results[::2])
+    return f"<html><head>{_padding(page_kb)}</head><body><div id=\"search\">{items}</div></body></html>"
+
+
+RENDERERS = {"DuckDuckGo": render_duckduckgo, "Bing": render_bing, "Google": render_google}
+
+
+def synthetic_page(engine: str, query: str, page_kb: int = 60) -> str:
+    return RENDERERS[engine](synthetic_results(query), page_kb)
+
+
+def load_fixtures(directory: Path) -> Dict[str, List[str]]:
+    fixtures = {engine: [p.read_text(encoding="utf-8", errors="replace") for p in sorted(directory.glob(f"{engine.lower()}*.html"))]
+                for engine in RENDERERS}
+    missing = [engine for engine, pages in fixtures.items() if not pages]
+    if missing:
+        raise SystemExit(f"sem HTML gravado para: {', '.join(missing)} em {directory}")
+    return fixtures
+
+
+def load_blocked_pages(directory: Path) -> Dict[str, str]:
+    """Página de CAPTCHA gravada de cada motor (blocked-<motor>.html), quando existir"""
+    return {engine: path.read_text(encoding="utf-8", errors="replace") for engine in RENDERERS
+            if (path := directory / f"blocked-{engine.lower()}.html").exists()}
+
+
+class StubSerpServer:
+    """ThreadingHTTPServer em thread própria; a latência simulada não ocupa o event loop da API"""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.fixtures = load_fixtures(config.fixtures) if config.fixtures else None
+        self.blocked_pages = load_blocked_pages(config.fixtures) if config.fixtures else {}
+        self.requests: Dict[str, int] = {engine: 0 for engine in RENDERERS}
+        self.arrivals: Dict[str, List[float]] = {engine: [] for engine in RENDERERS}
+        self.active: Dict[str, int] = {engine: 0 for engine in RENDERERS}
+        self.peak_active: Dict[str, int] = {engine: 0 for engine in RENDERERS}
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page(self, engine: str, query: str) -> str:
+        if self.fixtures:
+            pages = self.fixtures[engine]
+            return pages[int(hashlib.sha256(query.encode("utf-8")).hexdigest(), 16) % len(pages)]
+        return synthetic_page(engine, query, self.config.page_kb)
+
+    def respond(self, engine: str, query: str):
+        """(status, corpo, espera em segundos) para uma requisição"""
+        with self._lock:
+            self.requests[engine] += 1
+            self.arrivals[engine].append(time.monotonic())
+            self.active[engine] += 1
+            self.peak_active[engine] = max(self.peak_active[engine], self.active[engine])
+            roll = self._rng.random()
+            delay = self.config.latency_ms / 1000 * self._rng.uniform(1 - self.config.jitter, 1 + self.config.jitter)
+        if roll < self.config.error_rate:
+            return 503, "<html><body>Service Unavailable</body></html>", delay
+        if roll < self.config.error_rate + self.config.captcha_rate:
+            return 200, self.blocked_pages.get(engine, CAPTCHA_PAGE), delay
+        return 200, self.page(engine, query), delay
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                engine = ENGINE_HOSTS.get(self.headers.get("Host", "").split(":")[0])
+                if engine is None:
+                    self.send_error(404)
+                    return
+                query = parse_qs(urlsplit(self.path).query).get("q", [""])[0]
+                status, body, delay = stub.respond(engine, query)
+                time.sleep(delay)
+                with stub._lock:
+                    stub.active[engine] -= 1
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubSerpServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    """Envia toda requisição ao StubSerpServer; o Host original identifica o motor"""
+
+    def __init__(self, address: str, **transport_options):
+        self.target = httpx.URL(address)
+        self.inner = httpx.AsyncHTTPTransport(**transport_options)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(scheme=self.target.scheme, host=self.target.host, port=self.target.port)
+        return await self.inner.handle_async_request(request)
+
+    async def aclose(self):
+        await self.inner.aclose()
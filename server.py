@@ -1,21 +1,43 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict, Any
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+from pydantic import BaseModel, EmailStr, ValidationError
+from typing import Optional, List, Dict, Any, Callable, Union
 from datetime import datetime, timezone, timedelta
 import os
 import bcrypt
 import jwt
-import requests
+import httpx
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne, ReplaceOne, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure, BulkWriteError, PyMongoError
+from pymongo import monitoring
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 import uuid
-from bs4 import BeautifulSoup
-from urllib.parse import quote, unquote
+import json
+import csv
+import io
+import base64
+import hashlib
+import zlib
+import brotli
+import orjson
+from lxml import etree, html as lxml_html
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote, urlsplit, urlunsplit, parse_qsl
 from dotenv import load_dotenv
 from pathlib import Path
 import re
 import random
+import time
+import unicodedata
+import functools
+import logging
+from contextlib import contextmanager, asynccontextmanager
+from collections import OrderedDict, deque
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -26,17 +48,288 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'verificapessoa_secret_2025')
 PIX_KEY = "3656e000-acb3-4645-a176-034c4d9ba6df"
 PIX_NAME = "Verifica Pessoa"
 
-app = FastAPI(title="VerificaPessoa API", version="1.0.0")
+# Cliente HTTP dos motores de busca (pool keep-alive por motor)
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '30'))
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '10'))
+HTTP_MAX_KEEPALIVE = int(os.environ.get('HTTP_MAX_KEEPALIVE', '5'))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '30'))
 
-@app.middleware("http")
-async def add_cors_headers(request, call_next):
-    response = await call_next(request)
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
-    response.headers["Access-Control-Allow-Headers"] = "*"
-    return response
+# Limites de cortesia por motor (concorrência + token bucket em requisições/s)
+ENGINE_MAX_CONCURRENCY = int(os.environ.get('ENGINE_MAX_CONCURRENCY', '4'))
+ENGINE_RATE_PER_SEC = float(os.environ.get('ENGINE_RATE_PER_SEC', '2'))
+ENGINE_BURST = int(os.environ.get('ENGINE_BURST', '6'))
+# 'local': limites valem por processo; 'mongo': globais entre todos os workers/pods (coleção engine_limits)
+ENGINE_LIMITS_BACKEND = os.environ.get('ENGINE_LIMITS_BACKEND', 'local')
+ENGINE_LEASE_SECONDS = float(os.environ.get('ENGINE_LEASE_SECONDS', '60'))
 
+# Saúde dos motores medida no tráfego real: circuit breaker e timeout adaptativo
+ENGINE_HEALTH_WINDOW = int(os.environ.get('ENGINE_HEALTH_WINDOW', '50'))
+ENGINE_BREAKER_MIN_SAMPLES = int(os.environ.get('ENGINE_BREAKER_MIN_SAMPLES', '8'))
+ENGINE_BREAKER_FAILURE_RATE = float(os.environ.get('ENGINE_BREAKER_FAILURE_RATE', '0.5'))
+ENGINE_BREAKER_CONSECUTIVE = int(os.environ.get('ENGINE_BREAKER_CONSECUTIVE', '5'))
+ENGINE_BREAKER_COOLDOWN = float(os.environ.get('ENGINE_BREAKER_COOLDOWN', '30'))
+ENGINE_BREAKER_MAX_COOLDOWN = float(os.environ.get('ENGINE_BREAKER_MAX_COOLDOWN', '600'))
+ENGINE_TIMEOUT_MIN = float(os.environ.get('ENGINE_TIMEOUT_MIN', '4'))
+ENGINE_TIMEOUT_FACTOR = float(os.environ.get('ENGINE_TIMEOUT_FACTOR', '3'))
+
+# Cache de resultados de search_person (LRU em memória + coleção search_cache)
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', '21600'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', '1000'))
+# Intervalo em que cada worker relê TTL e geração do cache em db.settings (invalidações de outros workers)
+SEARCH_CACHE_SYNC_SECONDS = float(os.environ.get('SEARCH_CACHE_SYNC_SECONDS', '5'))
+
+# Cache de SERP por (motor, query), compartilhado entre buscas
+SERP_CACHE_TTL = int(os.environ.get('SERP_CACHE_TTL', '3600'))
+SERP_CACHE_MAX_ENTRIES = int(os.environ.get('SERP_CACHE_MAX_ENTRIES', '2000'))
+
+# Planejador de queries: orçamento de requisições upstream por busca (0 = sem limite), itens
+# distintos que saturam uma seção (0 = nunca satura), queries por onda e mínimo de resultados da
+# query base para não tratar o nome como raro
+SEARCH_REQUEST_BUDGET = int(os.environ.get('SEARCH_REQUEST_BUDGET', '14'))
+PLANNER_SECTION_TARGET = int(os.environ.get('PLANNER_SECTION_TARGET', '8'))
+PLANNER_WAVE_SIZE = int(os.environ.get('PLANNER_WAVE_SIZE', '3'))
+PLANNER_RARE_RESULTS = int(os.environ.get('PLANNER_RARE_RESULTS', '1'))
+# Prazo total de uma busca em segundos (0 = sem prazo): ao estourar, a análise usa o que já chegou
+SEARCH_DEADLINE = float(os.environ.get('SEARCH_DEADLINE', '20'))
+
+# Threads dedicadas ao parse de HTML (lxml libera o GIL durante o parse)
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', '4'))
+
+# Fila persistente de buscas assíncronas (coleção search_jobs)
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', '2'))
+SEARCH_JOB_POLL_INTERVAL = float(os.environ.get('SEARCH_JOB_POLL_INTERVAL', '2'))
+SEARCH_JOB_HEARTBEAT = float(os.environ.get('SEARCH_JOB_HEARTBEAT', '15'))
+SEARCH_JOB_MAX_ATTEMPTS = int(os.environ.get('SEARCH_JOB_MAX_ATTEMPTS', '3'))
+SEARCH_JOB_RETENTION_DAYS = int(os.environ.get('SEARCH_JOB_RETENTION_DAYS', '7'))
+
+# Lotes de buscas (/api/search/batch): executados pela mesma fila, com prioridade menor que jobs avulsos
+BATCH_MAX_ENTRIES = int(os.environ.get('BATCH_MAX_ENTRIES', '1000'))
+BATCH_MAX_UPLOAD_BYTES = int(os.environ.get('BATCH_MAX_UPLOAD_BYTES', '2097152'))
+
+# Renovação em segundo plano das buscas mais repetidas (histórico em db.searches) enquanto a API
+# está ociosa; HOT_REFRESH_TOP=0 desliga. Orçamento em requisições upstream por hora
+HOT_REFRESH_TOP = int(os.environ.get('HOT_REFRESH_TOP', '20'))
+HOT_REFRESH_MIN_SEARCHES = int(os.environ.get('HOT_REFRESH_MIN_SEARCHES', '3'))
+HOT_REFRESH_WINDOW_DAYS = int(os.environ.get('HOT_REFRESH_WINDOW_DAYS', '7'))
+HOT_REFRESH_INTERVAL = float(os.environ.get('HOT_REFRESH_INTERVAL', '300'))
+HOT_REFRESH_IDLE_SECONDS = float(os.environ.get('HOT_REFRESH_IDLE_SECONDS', '60'))
+HOT_REFRESH_BUDGET_PER_HOUR = int(os.environ.get('HOT_REFRESH_BUDGET_PER_HOUR', '120'))
+HOT_REFRESH_STALE_FRACTION = float(os.environ.get('HOT_REFRESH_STALE_FRACTION', '0.5'))
+
+# bcrypt: custo configurável e pool dedicado com limite de fila
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', '2'))
+PASSWORD_QUEUE_LIMIT = int(os.environ.get('PASSWORD_QUEUE_LIMIT', '32'))
+
+# Cache de usuários autenticados e de tokens já verificados
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '15'))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', '300'))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000'))
+
+# Listagens admin paginadas por cursor
+ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', '50'))
+ADMIN_PAGE_MAX = int(os.environ.get('ADMIN_PAGE_MAX', '500'))
+
+# Respostas: compressão gzip/brotli acima de um tamanho mínimo
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '4'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+# Observabilidade: logs estruturados (DEBUG cobre o caminho quente das buscas) e métricas em /metrics
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+
+# LOGS ESTRUTURADOS
+class StructuredFormatter(logging.Formatter):
+    """Uma linha por evento: JSON, ou texto com os campos extras em chave=valor"""
+    RESERVED = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+    
+    def __init__(self, as_json: bool):
+        super().__init__()
+        self.as_json = as_json
+    
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {k: v for k, v in vars(record).items() if k not in self.RESERVED}
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+        timestamp = datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+        if self.as_json:
+            return json.dumps({"ts": timestamp, "level": record.levelname.lower(), "logger": record.name, "msg": record.getMessage(), **fields}, ensure_ascii=False, default=str)
+        extras = " ".join(f"{k}={v}" for k, v in fields.items())
+        return f"{timestamp} {record.levelname:7} {record.getMessage()} {extras}".rstrip()
+
+log = logging.getLogger("verificapessoa")
+if not log.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(StructuredFormatter(LOG_FORMAT == "json"))
+    log.addHandler(_log_handler)
+    log.setLevel(LOG_LEVEL)
+    log.propagate = False
+
+# MÉTRICAS (Prometheus)
+STAGE_SECONDS = Histogram("verificapessoa_stage_seconds", "Duração de cada etapa (fetch/parse por motor, extratores, Mongo, bcrypt, busca)", ["stage", "target"],
+                          buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+HTTP_REQUEST_SECONDS = Histogram("verificapessoa_http_request_seconds", "Tempo total por requisição HTTP", ["method", "route", "status"])
+ENGINE_REQUESTS = Counter("verificapessoa_engine_requests_total", "Requisições aos motores por desfecho", ["engine", "outcome"])
+ENGINE_RESULTS = Counter("verificapessoa_engine_results_total", "Resultados parseados por motor", ["engine"])
+SEARCH_CACHE_EVENTS = Counter("verificapessoa_search_cache_total", "Consultas ao cache de resultados de busca", ["event"])
+STAGE_ERRORS = Counter("verificapessoa_errors_total", "Exceções por etapa", ["stage"])
+HOT_REFRESHES = Counter("verificapessoa_hot_refresh_total", "Termos frequentes avaliados pela renovação em segundo plano", ["outcome"])
+PLANNER_QUERIES = Counter("verificapessoa_planner_queries_total", "Templates de query por decisão do planejador", ["template", "status"])
+
+@contextmanager
+def span(stage: str, target: str = ""):
+    """Mede a etapa no histograma; exceções (não cancelamentos) contam em verificapessoa_errors_total"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage, target).observe(time.perf_counter() - start)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Tempo de todo comando enviado ao Mongo, por comando e coleção"""
+    def __init__(self):
+        self._pending: Dict[tuple, str] = {}
+    
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else event.command.get("collection", "")
+        self._pending[(event.connection_id, event.request_id)] = f"{event.command_name}:{collection}"
+    
+    def _finish(self, event) -> str:
+        target = self._pending.pop((event.connection_id, event.request_id), event.command_name)
+        STAGE_SECONDS.labels("mongo", target).observe(event.duration_micros / 1_000_000)
+        return target
+    
+    def succeeded(self, event):
+        self._finish(event)
+    
+    def failed(self, event):
+        self._finish(event)
+        STAGE_ERRORS.labels("mongo").inc()
+
+mongo_metrics = MongoCommandMetrics()
+
+# RESPOSTAS: serialização com orjson e compressão
+class FastJSONResponse(ORJSONResponse):
+    """orjson (datetimes nativos, UTF-8 sem escapes); tipos desconhecidos viram str como no json.dumps(default=str)"""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """br quando o cliente aceita, senão gzip; None se nenhum dos dois for aceito"""
+    offered: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            offered[name.strip()] = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            offered[name.strip()] = 0.0
+    for encoding in ("br", "gzip"):
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+class StreamCompressor:
+    """Compressão incremental: cada pedaço sai com flush para o cliente receber streams sem atraso"""
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._brotli = brotli.Compressor(quality=BROTLI_QUALITY) if encoding == "br" else None
+        self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if encoding == "gzip" else None
+    
+    def chunk(self, data: bytes) -> bytes:
+        if self._brotli:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._brotli:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+class CompressionMiddleware:
+    """gzip/brotli conforme Accept-Encoding para corpos >= minimum_size e para streams (exceto SSE)"""
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start_message = None
+        compressor: Optional[StreamCompressor] = None
+        
+        async def compressed_send(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or (start_message is None and compressor is None):
+                await send(message)
+                return
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if compressor is not None:
+                await send({"type": "http.response.body", "body": compressor.chunk(body) if more_body else compressor.finish(body), "more_body": more_body})
+                return
+            # Primeiro pedaço do corpo: decide entre comprimir e repassar
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            if ("content-encoding" in headers or headers.get("content-type", "").startswith("text/event-stream")
+                    or (not more_body and len(body) < self.minimum_size)):
+                await send(start)
+                await send(message)
+                return
+            compressor = StreamCompressor(encoding)
+            headers["Content-Encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                body = compressor.chunk(body)
+            else:
+                body = compressor.finish(body)
+                headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+        
+        await self.app(scope, receive, compressed_send)
+
+class RequestMetricsMiddleware:
+    """Duração de cada requisição em HTTP_REQUEST_SECONDS, até o último pedaço do corpo (streams inclusive)"""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        
+        async def observed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, observed_send)
+        finally:
+            # Rota como declarada (/api/search/{job_id}), não o caminho: mantém a cardinalidade baixa
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], getattr(route, "path", "unmatched"), str(status)).observe(time.perf_counter() - start)
+
+app = FastAPI(title="VerificaPessoa API", version="1.0.0", default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+
+# CORS em uma única camada ASGI (a mais externa: preflights não passam pelos demais middlewares)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["https://verificapessoa.com", "https://www.verificapessoa.com", "http://localhost:3000", "*"],
@@ -50,20 +343,154 @@ app.add_middleware(
 client = None
 db = None
 
+# ÍNDICES: declarados aqui e reconciliados no startup
+def required_indexes() -> Dict[str, List[IndexModel]]:
+    return {
+        "users": [
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        ],
+        "searches": [
+            IndexModel([("user_email", ASCENDING), ("created_at", DESCENDING)], name="user_email_created_at"),
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        ],
+        "transactions": [
+            IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+            IndexModel([("user_email", ASCENDING), ("created_at", DESCENDING)], name="user_email_created_at"),
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        ],
+        "search_jobs": [
+            IndexModel([("status", ASCENDING), ("priority", ASCENDING), ("created_at", ASCENDING)], name="status_priority_created_at"),
+            IndexModel([("status", ASCENDING), ("heartbeat_at", ASCENDING)], name="status_heartbeat_at"),
+            IndexModel([("batch_id", ASCENDING), ("position", ASCENDING)], name="batch_id_position"),
+            IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=SEARCH_JOB_RETENTION_DAYS * 86400),
+        ],
+        "search_batches": [
+            IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=SEARCH_JOB_RETENTION_DAYS * 86400),
+        ],
+        "search_cache": [
+            IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=max(search_cache.ttl, 0)),
+        ],
+    }
+
+# Formas de consulta usadas pela API, conferidas contra os índices via explain()
+QUERY_SHAPES = [
+    ("login/registro por email", "users", {"email": "x@x.com"}, None),
+    ("listagem admin de usuários", "users", {}, [("created_at", -1), ("_id", -1)]),
+    ("buscas por usuário", "searches", {"user_email": "x@x.com"}, [("created_at", -1), ("_id", -1)]),
+    ("listagem admin de buscas", "searches", {"created_at": {"$gte": datetime(2000, 1, 1)}}, [("created_at", -1), ("_id", -1)]),
+    ("transações por status", "transactions", {"status": "confirmed"}, [("created_at", -1), ("_id", -1)]),
+    ("transações por usuário", "transactions", {"user_email": "x@x.com"}, [("created_at", -1), ("_id", -1)]),
+    ("listagem admin de transações", "transactions", {}, [("created_at", -1), ("_id", -1)]),
+    ("claim de job", "search_jobs", {"status": "queued"}, [("priority", 1), ("created_at", 1)]),
+    ("jobs de um lote", "search_jobs", {"batch_id": "x"}, [("position", 1)]),
+    ("jobs sem heartbeat", "search_jobs", {"status": "running", "heartbeat_at": {"$lt": datetime(2000, 1, 1)}}, None),
+]
+
+def _index_key(key) -> List[tuple]:
+    """Chave do índice com direções numéricas como int: o servidor pode reportar 1.0 em vez de 1"""
+    items = key.items() if isinstance(key, dict) else key
+    return [(field, int(direction) if isinstance(direction, (int, float)) and not isinstance(direction, bool) else direction) for field, direction in items]
+
+async def ensure_indexes():
+    """Cria índices ausentes e recria os que mudaram de definição; índices extras são mantidos"""
+    for collection, models in required_indexes().items():
+        existing = await db[collection].index_information()
+        for model in models:
+            spec = model.document
+            name = spec["name"]
+            current = existing.get(name)
+            same_key = current and _index_key(current["key"]) == _index_key(spec["key"]) and current.get("unique", False) == spec.get("unique", False)
+            if same_key and current.get("expireAfterSeconds") == spec.get("expireAfterSeconds"):
+                continue
+            try:
+                if same_key and "expireAfterSeconds" in current:
+                    # Só o TTL mudou: ajusta sem reconstruir o índice
+                    await db.command("collMod", collection, index={"name": name, "expireAfterSeconds": spec["expireAfterSeconds"]})
+                    continue
+                if current:
+                    await db[collection].drop_index(name)
+                await db[collection].create_indexes([model])
+                log.info("índice criado", extra={"collection": collection, "index": name})
+            except OperationFailure as e:
+                # Ex.: emails duplicados impedem o índice único; a API continua subindo
+                log.error("falha ao criar índice", extra={"collection": collection, "index": name, "error": str(e)[:150]})
+
+def _plan_stages(plan: dict) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for child in [plan.get("inputStage"), *plan.get("inputStages", [])]:
+        if child:
+            stages.extend(_plan_stages(child))
+    return stages
+
+async def check_query_coverage() -> List[Dict[str, Any]]:
+    report = []
+    for label, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        stages = _plan_stages(plan.get("queryPlan", plan))
+        report.append({
+            "query": label,
+            "collection": collection,
+            "stages": stages,
+            "covered": "COLLSCAN" not in stages,
+            "in_memory_sort": "SORT" in stages
+        })
+    return report
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=5000, connectTimeoutMS=10000, socketTimeoutMS=10000, tls=True, tlsAllowInvalidCertificates=True, event_listeners=[mongo_metrics])
+
 @app.on_event("startup")
 async def startup_db_client():
     global client, db
     try:
-        client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=5000, connectTimeoutMS=10000, socketTimeoutMS=10000, tls=True, tlsAllowInvalidCertificates=True)
+        client = create_mongo_client()
         await client.admin.command('ping')
-        db = client[DB_NAME]
-        print(f"✅ MongoDB conectado: {DB_NAME}")
+        log.info("MongoDB conectado", extra={"db": DB_NAME})
+        await init_database(client[DB_NAME])
     except Exception as e:
-        print(f"❌ ERRO MongoDB: {e}")
+        log.error("falha ao conectar ao MongoDB", extra={"error": str(e)})
         raise
 
+WORKER_ID = f"{os.uname().nodename}:{os.getpid()}"
+
+async def take_lease(name: str, holder: str, seconds: float) -> bool:
+    """Lease em settings: o upsert colide com o documento de outro processo cujo lease ainda vale"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.settings.update_one(
+            {"_id": name, "$or": [{"lease_until": {"$lt": now}}, {"holder": holder}]},
+            {"$set": {"holder": holder, "lease_until": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def init_database(database):
+    """Prepara o banco e inicia os workers; separado da conexão para uso com outro cliente (benchmarks)"""
+    global db
+    db = database
+    await search_cache.load_settings()
+    await search_system.limiter.setup()
+    await ensure_indexes()
+    # Vários workers sobem juntos com stats vazia: só quem pegar o lease recalcula
+    if not await db.stats.find_one({"_id": "totals"}, {"_id": 1}) and await take_lease("stats_rebuild", WORKER_ID, 300):
+        try:
+            await rebuild_stats()
+        except PyMongoError as e:
+            log.error("falha ao recalcular estatísticas", extra={"error": str(e)[:150]})
+    await search_jobs.start()
+    await hot_refresher.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await hot_refresher.stop()
+    await search_jobs.stop()
+    await search_system.close()
     client.close()
 
 class UserCreate(BaseModel):
@@ -83,306 +510,573 @@ class UserResponse(BaseModel):
 class SearchRequest(BaseModel):
     name: Optional[str] = None
     cpf: Optional[str] = None
+    force_refresh: bool = False
+    async_job: bool = False
+
+class BatchEntry(BaseModel):
+    name: Optional[str] = None
+    cpf: Optional[str] = None
+
+class BatchSearchRequest(BaseModel):
+    entries: List[Union[str, BatchEntry]]
+    force_refresh: bool = False
     
 class PurchaseRequest(BaseModel):
     package_type: str
     amount: float
     credits: int
 
-# SISTEMA MULTI-SEARCH (Google + Bing + DuckDuckGo)
-class MultiSearchEngine:
-    def __init__(self):
-        self.timeout = 30
-        self.user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
-        ]
+class TokenBucket:
+    """Token bucket assíncrono: libera no máximo `rate` requisições/s com rajadas de até `capacity`"""
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
     
-    def get_headers(self):
-        return {
-            'User-Agent': random.choice(self.user_agents),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+    async def acquire(self):
+        # O lock mantém a fila em ordem de chegada enquanto se espera o próximo token
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class LocalEngineLimiter:
+    """Limites de cortesia por processo: semáforo + token bucket em memória para cada motor"""
+    def __init__(self, engines: tuple, rate: float, burst: int, concurrency: int):
+        self._semaphores = {engine: asyncio.Semaphore(concurrency) for engine in engines}
+        self._buckets = {engine: TokenBucket(rate, burst) for engine in engines}
+        self.in_use = {engine: 0 for engine in engines}
     
-    async def search_duckduckgo(self, query: str) -> List[Dict[str, Any]]:
-        """DuckDuckGo - HTML simples sem JavaScript"""
+    async def setup(self):
+        pass
+    
+    @asynccontextmanager
+    async def slot(self, engine: str):
+        async with self._semaphores[engine]:
+            await self._buckets[engine].acquire()
+            self.in_use[engine] += 1
+            try:
+                yield
+            finally:
+                self.in_use[engine] -= 1
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        return {"backend": "local", "engines": {engine: {"tokens": round(bucket.tokens, 2), "in_use": self.in_use[engine]}
+                                                for engine, bucket in self._buckets.items()}}
+
+class MongoEngineLimiter:
+    """Limites globais entre processos, um documento por motor em engine_limits.
+    
+    Taxa: GCRA (token bucket equivalente) sobre o campo 'tat' (próximo instante teórico de chegada,
+    em segundos epoch). Uma requisição passa se tat <= agora + tolerância de rajada e empurra tat em
+    1/rate, com uma única atualização condicional e atômica. Concorrência: 'leases' guarda as vagas
+    em uso com validade, de modo que um worker que morre no meio de um fetch libera a vaga sozinho.
+    Os relógios dos hosts precisam estar sincronizados (NTP). Se o Mongo falhar, o limite local assume.
+    collection substitui db.engine_limits (qualquer objeto com a mesma API assíncrona, ex.: nos testes).
+    """
+    def __init__(self, engines: tuple, rate: float, burst: int, concurrency: int, lease_seconds: float = ENGINE_LEASE_SECONDS,
+                 collection=None):
+        self.engines = engines
+        self._collection = collection
+        self.interval = 1 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.fallback = LocalEngineLimiter(engines, rate, burst, concurrency)
+        self.degraded = False
+    
+    @property
+    def collection(self):
+        return self._collection if self._collection is not None else db.engine_limits
+    
+    async def setup(self):
+        for engine in self.engines:
+            await self.collection.update_one({"_id": engine}, {"$setOnInsert": {"tat": 0.0, "leases": []}}, upsert=True)
+    
+    async def _take_token(self, engine: str) -> float:
+        """0 se o token foi obtido; senão, segundos até o próximo token"""
+        now = time.time()
+        if await self.collection.find_one_and_update({"_id": engine, "tat": {"$lt": now}}, {"$set": {"tat": now + self.interval}}, projection={"_id": 1}):
+            return 0.0
+        if await self.collection.find_one_and_update({"_id": engine, "tat": {"$lte": now + self.tolerance}}, {"$inc": {"tat": self.interval}}, projection={"_id": 1}):
+            return 0.0
+        doc = await self.collection.find_one({"_id": engine}, {"tat": 1})
+        return max(0.001, doc["tat"] - self.tolerance - now) if doc else 0.0
+    
+    async def _take_lease(self, engine: str, lease_id: str) -> bool:
+        now = time.time()
+        await self.collection.update_one({"_id": engine}, {"$pull": {"leases": {"expires": {"$lt": now}}}})
+        # leases.<N-1> ausente = menos de N vagas em uso
+        return bool(await self.collection.find_one_and_update(
+            {"_id": engine, f"leases.{self.concurrency - 1}": {"$exists": False}},
+            {"$push": {"leases": {"id": lease_id, "expires": now + self.lease_seconds}}}, projection={"_id": 1}))
+    
+    async def _acquire(self, engine: str, lease_id: str):
+        delay = 0.02
+        while not await self._take_lease(engine, lease_id):
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 0.5)
+        while (wait := await self._take_token(engine)) > 0:
+            await asyncio.sleep(wait)
+    
+    @asynccontextmanager
+    async def slot(self, engine: str):
+        lease_id = uuid.uuid4().hex
         try:
-            print(f"    🦆 Buscando no DuckDuckGo: {query[:50]}...")
-            
-            encoded_query = quote(query)
-            url = f'https://html.duckduckgo.com/html/?q={encoded_query}'
-            
-            headers = self.get_headers()
-            response = requests.get(url, headers=headers, timeout=self.timeout)
-            
-            if response.status_code != 200:
-                print(f"    ❌ DuckDuckGo status {response.status_code}")
-                return []
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = []
-            
-            # DuckDuckGo tem estrutura simples
-            result_divs = soup.find_all('div', class_='result')
-            
-            for div in result_divs[:20]:
-                title_elem = div.find('a', class_='result__a')
-                snippet_elem = div.find('a', class_='result__snippet')
-                
-                if title_elem:
-                    title = title_elem.get_text().strip()
-                    snippet = snippet_elem.get_text().strip() if snippet_elem else ""
-                    url = title_elem.get('href', '')
-                    
-                    results.append({
-                        "engine": "DuckDuckGo",
-                        "title": title[:300],
-                        "snippet": snippet[:500],
-                        "url": url[:500]
-                    })
-            
-            print(f"    ✅ DuckDuckGo: {len(results)} resultados")
-            return results
-            
-        except Exception as e:
-            print(f"    ❌ Erro DuckDuckGo: {str(e)[:100]}")
-            return []
+            await self._acquire(engine, lease_id)
+            acquired = True
+        except PyMongoError as e:
+            acquired = False
+            await asyncio.shield(self._release(engine, lease_id))
+            if not self.degraded:
+                log.warning("limites globais indisponíveis, usando limites locais", extra={"engine": engine, "error": str(e)[:100]})
+                self.degraded = True
+        except BaseException:
+            await asyncio.shield(self._release(engine, lease_id))
+            raise
+        if not acquired:
+            async with self.fallback.slot(engine):
+                yield
+            return
+        if self.degraded:
+            log.info("limites globais restabelecidos", extra={"engine": engine})
+            self.degraded = False
+        try:
+            yield
+        finally:
+            await asyncio.shield(self._release(engine, lease_id))
     
-    async def search_bing(self, query: str) -> List[Dict[str, Any]]:
-        """Bing - Alternativa ao Google"""
+    async def _release(self, engine: str, lease_id: str):
         try:
-            print(f"    🔵 Buscando no Bing: {query[:50]}...")
-            
-            encoded_query = quote(query)
-            url = f'https://www.bing.com/search?q={encoded_query}&count=30&setlang=pt-BR'
-            
-            headers = self.get_headers()
-            response = requests.get(url, headers=headers, timeout=self.timeout)
-            
-            if response.status_code != 200:
-                print(f"    ❌ Bing status {response.status_code}")
-                return []
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = []
-            
-            # Bing usa class 'b_algo'
-            result_divs = soup.find_all('li', class_='b_algo')
-            
-            for div in result_divs[:20]:
-                title_elem = div.find('h2')
-                snippet_elem = div.find('p') or div.find('div', class_='b_caption')
-                link_elem = div.find('a', href=True)
-                
-                if title_elem:
-                    title = title_elem.get_text().strip()
-                    snippet = snippet_elem.get_text().strip() if snippet_elem else ""
-                    url = link_elem['href'] if link_elem else ""
-                    
-                    results.append({
-                        "engine": "Bing",
-                        "title": title[:300],
-                        "snippet": snippet[:500],
-                        "url": url[:500]
-                    })
-            
-            print(f"    ✅ Bing: {len(results)} resultados")
-            return results
-            
-        except Exception as e:
-            print(f"    ❌ Erro Bing: {str(e)[:100]}")
-            return []
+            await self.collection.update_one({"_id": engine}, {"$pull": {"leases": {"id": lease_id}}})
+        except PyMongoError as e:
+            # A vaga expira sozinha depois de lease_seconds
+            log.warning("falha ao liberar vaga do motor", extra={"engine": engine, "error": str(e)[:100]})
     
-    async def search_google(self, query: str) -> List[Dict[str, Any]]:
-        """Google - Tentativa com múltiplos seletores"""
+    async def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        docs = {doc["_id"]: doc async for doc in self.collection.find({"_id": {"$in": list(self.engines)}})}
+        engines = {}
+        for engine in self.engines:
+            doc = docs.get(engine, {})
+            backlog = max(0.0, doc.get("tat", 0.0) - now)
+            engines[engine] = {"tokens": round(max(0.0, (self.tolerance - backlog) / self.interval + 1), 2),
+                               "in_use": sum(1 for lease in doc.get("leases", []) if lease["expires"] >= now)}
+        return {"backend": "mongo", "degraded": self.degraded, "engines": engines}
+
+def create_engine_limiter(backend: str, engines: tuple):
+    if backend == "mongo":
+        return MongoEngineLimiter(engines, ENGINE_RATE_PER_SEC, ENGINE_BURST, ENGINE_MAX_CONCURRENCY)
+    if backend != "local":
+        raise ValueError(f"ENGINE_LIMITS_BACKEND inválido: {backend}")
+    return LocalEngineLimiter(engines, ENGINE_RATE_PER_SEC, ENGINE_BURST, ENGINE_MAX_CONCURRENCY)
+
+def as_utc(value: datetime) -> datetime:
+    """Mongo devolve datetimes sem fuso; todos são gravados em UTC"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+class TTLCache:
+    """Cache LRU em memória com expiração por idade"""
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+    
+    def get_entry(self, key) -> Optional[tuple]:
+        """Retorna (stored_at, value) ou None se ausente/expirado"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] >= self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+    
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[1] if entry else None
+    
+    def set(self, key, value, stored_at: Optional[float] = None):
+        self._data[key] = (stored_at if stored_at is not None else time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def pop(self, key):
+        self._data.pop(key, None)
+    
+    def clear(self):
+        self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+
+class SerpCache:
+    """Cache de resultados parseados por (motor, query) com coalescência de buscas idênticas simultâneas"""
+    def __init__(self, ttl: int, maxsize: int):
+        self.memory = TTLCache(maxsize, ttl)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._waiters: Dict[tuple, int] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+    
+    def _count(self, engine: str, field: str):
+        counters = self.stats.setdefault(engine, {"hits": 0, "misses": 0, "coalesced": 0})
+        counters[field] += 1
+    
+    def _finish(self, key: tuple, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Listas vazias indicam erro/bloqueio do motor: não ficam em cache
+        if not task.cancelled() and task.exception() is None and task.result():
+            self.memory.set(key, task.result())
+    
+    async def get_or_fetch(self, engine: str, query: str, fetch) -> List[Dict[str, Any]]:
+        key = (engine, query)
+        cached = self.memory.get(key)
+        if cached is not None:
+            self._count(engine, "hits")
+            return list(cached)
+        task = self._inflight.get(key)
+        if task is None:
+            self._count(engine, "misses")
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._finish, key))
+        else:
+            self._count(engine, "coalesced")
+        self._waiters[key] = self._waiters.get(key, 0) + 1
         try:
-            print(f"    🔴 Buscando no Google: {query[:50]}...")
-            
-            encoded_query = quote(query)
-            url = f'https://www.google.com/search?q={encoded_query}&num=30&hl=pt-BR'
-            
-            headers = self.get_headers()
-            response = requests.get(url, headers=headers, timeout=self.timeout)
-            
-            if response.status_code != 200:
-                print(f"    ❌ Google status {response.status_code}")
-                return []
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = []
-            
-            # Múltiplos seletores do Google
-            search_divs = (
-                soup.find_all('div', class_='g') or
-                soup.find_all('div', class_='tF2Cxc') or
-                soup.select('div[data-hveid]')
-            )
-            
-            for div in search_divs[:20]:
-                title_elem = div.find('h3')
-                snippet_elem = div.find('div', class_='VwiC3b') or div.find('span')
-                link_elem = div.find('a', href=True)
-                
-                if title_elem:
-                    title = title_elem.get_text().strip()
-                    snippet = snippet_elem.get_text().strip() if snippet_elem else ""
-                    url = link_elem['href'] if link_elem else ""
-                    
-                    if url.startswith('/url?q='):
-                        url = url.split('/url?q=')[1].split('&')[0]
-                    
-                    results.append({
-                        "engine": "Google",
-                        "title": title[:300],
-                        "snippet": snippet[:500],
-                        "url": url[:500]
-                    })
-            
-            print(f"    ✅ Google: {len(results)} resultados")
-            return results
-            
-        except Exception as e:
-            print(f"    ❌ Erro Google: {str(e)[:100]}")
-            return []
+            # shield: cancelar um dos interessados não derruba a busca dos demais
+            return list(await asyncio.shield(task))
+        except asyncio.CancelledError:
+            # O último interessado desistiu (ex.: prazo da busca): o fetch é cancelado também
+            if self._waiters[key] == 1:
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
     
-    async def search_multi_engine(self, query: str) -> List[Dict[str, Any]]:
-        """Busca em TODOS os motores e combina resultados"""
-        
-        all_results = []
-        
-        # ESTRATÉGIA: Tentar todos em paralelo
-        print(f"\n  🔍 Buscando '{query}' em 3 motores...")
-        
-        # DuckDuckGo (mais confiável)
-        duckduckgo_results = await self.search_duckduckgo(query)
-        all_results.extend(duckduckgo_results)
-        await asyncio.sleep(random.uniform(1.0, 2.0))
-        
-        # Bing (backup)
-        bing_results = await self.search_bing(query)
-        all_results.extend(bing_results)
-        await asyncio.sleep(random.uniform(1.0, 2.0))
-        
-        # Google (se os outros falharem)
-        if len(all_results) < 5:
-            google_results = await self.search_google(query)
-            all_results.extend(google_results)
-        
-        print(f"  ✅ Total: {len(all_results)} resultados de múltiplas fontes")
-        
-        return all_results
+    def is_fresh(self, engine: str, query: str) -> bool:
+        """True se a query não custaria uma requisição upstream (em cache ou já em andamento)"""
+        key = (engine, query)
+        return key in self._inflight or self.memory.get_entry(key) is not None
     
-    async def extract_info_multi_engine(self, name: str) -> Dict[str, Any]:
-        """BUSCA com múltiplos motores (DuckDuckGo, Bing, Google)"""
-        
-        print(f"\n{'='*80}")
-        print(f"🔍 BUSCA MULTI-ENGINE: {name}")
-        print(f"{'='*80}\n")
-        
-        queries = [
-            f'"{name}"',
-            f'"{name}" Brasil',
-            f'"{name}" processos judiciais',
-            f'"{name}" CNPJ empresa',
-            f'"{name}" LinkedIn',
-            f'"{name}" redes sociais',
-        ]
-        
-        all_results = []
-        all_text = ""
-        
-        for i, query in enumerate(queries):
-            print(f"\n📊 Query {i+1}/{len(queries)}: {query}")
-            
-            results = await self.search_multi_engine(query)
-            
-            if results:
-                all_results.extend(results)
-                for r in results:
-                    all_text += " " + r['title'].lower() + " " + r['snippet'].lower()
-                print(f"  ✅ Total acumulado: {len(all_results)} resultados")
-            else:
-                print(f"  ⚠️ Query sem resultados")
-        
-        print(f"\n{'='*80}")
-        print(f"📊 TOTAL: {len(all_results)} resultados")
-        print(f"{'='*80}\n")
-        
-        # ANÁLISE
-        
-        print("⚖️ Analisando processos...")
-        processos = []
+    def get_stats(self) -> Dict[str, Any]:
+        return {"entries": len(self.memory), "in_flight": len(self._inflight), "ttl_seconds": self.memory.ttl, "engines": self.stats}
+
+def serp_cached(engine: str):
+    """Decora search_<motor>(query) para passar pelo SerpCache da instância"""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, query: str) -> List[Dict[str, Any]]:
+            return await self.serp_cache.get_or_fetch(engine, query, lambda: method(self, query))
+        return wrapper
+    return decorator
+
+# CANONICALIZAÇÃO DE URL: remove redirecionadores dos motores e parâmetros de
+# rastreamento para que a mesma página vinda de motores/queries diferentes seja
+# reconhecida como uma só
+TRACKING_PARAMS = frozenset({"gclid", "fbclid", "msclkid", "yclid", "dclid", "igshid", "srsltid", "mc_cid", "mc_eid", "_hsenc", "_hsmi", "ref", "ref_src"})
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def _unwrap_redirect(parts) -> Optional[str]:
+    """URL de destino de um link de redirecionamento de motor de busca, se for um"""
+    host = (parts.hostname or "").lower()
+    params = dict(parse_qsl(parts.query))
+    if host.endswith("duckduckgo.com") and parts.path.startswith("/l/"):
+        return params.get("uddg")
+    if (host == "" or ".google." in f".{host}") and parts.path == "/url":
+        return params.get("q") or params.get("url")
+    if host.endswith("bing.com") and parts.path == "/ck/a":
+        target = params.get("u", "")
+        if target.startswith("a1"):
+            try:
+                return base64.urlsafe_b64decode(target[2:] + "=" * (-len(target[2:]) % 4)).decode("utf-8")
+            except ValueError:
+                return None
+    return None
+
+def canonical_url(url: str) -> str:
+    url = url.strip()
+    if url.startswith("//"):
+        url = "https:" + url
+    for _ in range(3):
+        target = _unwrap_redirect(urlsplit(url))
+        if not target:
+            break
+        url = target.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+    host = parts.hostname.rstrip(".")
+    if ":" in host:
+        # hostname perde os colchetes do IPv6, necessários de volta no netloc
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+    query = "&".join(pair for pair in parts.query.split("&") if pair and not _is_tracking_param(unquote(pair.split("=", 1)[0])))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith("utm_")
+
+def url_dedup_key(url: str) -> str:
+    """Chave de deduplicação: ignora esquema, www. e barra final (URL já canonicalizada)"""
+    parts = urlsplit(url)
+    if not parts.hostname:
+        return url
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/")
+    return f"{host}{path}?{parts.query}" if parts.query else f"{host}{path}"
+
+class SerpResultMerger:
+    """Junta resultados repetidos entre motores e queries, preservando a ordem da primeira ocorrência.
+    
+    Cada resultado mesclado guarda em engines/queries quem o retornou; engine passa a listar todos os motores.
+    """
+    def __init__(self):
+        self.by_key: Dict[str, Dict[str, Any]] = {}
+        self.results: List[Dict[str, Any]] = []
+        self.received = 0
+    
+    def add(self, query: str, results: List[Dict[str, Any]]):
+        for result in results:
+            self.received += 1
+            key = url_dedup_key(result["url"]) if result["url"] else None
+            merged = self.by_key.get(key) if key else None
+            if merged is None:
+                merged = {**result, "engines": [result["engine"]], "queries": [query]}
+                self.results.append(merged)
+                if key:
+                    self.by_key[key] = merged
+                continue
+            if result["engine"] not in merged["engines"]:
+                merged["engines"].append(result["engine"])
+                merged["engine"] = ", ".join(merged["engines"])
+            if query not in merged["queries"]:
+                merged["queries"].append(query)
+            # Motores diferentes cortam título/snippet em pontos diferentes: fica o mais completo
+            for field in ("title", "snippet"):
+                if len(result[field]) > len(merged[field]):
+                    merged[field] = result[field]
+    
+    @property
+    def duplicates(self) -> int:
+        return self.received - len(self.results)
+
+# PARSE DE SERP (lxml + XPath pré-compilado, executado fora do event loop)
+def _xpath_class(cls: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+_DDG_RESULTS = etree.XPath(f"//div[{_xpath_class('result')}]")
+_DDG_TITLE = etree.XPath(f".//a[{_xpath_class('result__a')}]")
+_DDG_SNIPPET = etree.XPath(f".//a[{_xpath_class('result__snippet')}]")
+_BING_RESULTS = etree.XPath(f"//li[{_xpath_class('b_algo')}]")
+_BING_SNIPPET = etree.XPath(f"(.//p)[1] | (.//div[{_xpath_class('b_caption')}])[1]")
+_GOOGLE_RESULTS = [etree.XPath(f"//div[{_xpath_class('g')}]"), etree.XPath(f"//div[{_xpath_class('tF2Cxc')}]"), etree.XPath("//div[@data-hveid]")]
+_GOOGLE_SNIPPET = etree.XPath(f"(.//div[{_xpath_class('VwiC3b')}])[1] | (.//span)[1]")
+_FIRST_H2 = etree.XPath("(.//h2)[1]")
+_FIRST_H3 = etree.XPath("(.//h3)[1]")
+_FIRST_LINK = etree.XPath("(.//a[@href])[1]")
+
+def _parse_document(page: str):
+    try:
+        return lxml_html.document_fromstring(page)
+    except ValueError:
+        # Páginas com declaração de encoding não podem ser parseadas como str
+        return lxml_html.document_fromstring(page.encode('utf-8'), parser=lxml_html.HTMLParser(encoding='utf-8'))
+    except etree.ParserError:
+        return None
+
+def _text(elem) -> str:
+    return elem.text_content().strip() if elem is not None else ""
+
+def _first(matches):
+    return matches[0] if matches else None
+
+def _serp_record(engine: str, title: str, snippet: str, url: str) -> Dict[str, Any]:
+    return {"engine": engine, "title": title[:300], "snippet": snippet[:500], "url": canonical_url(url)[:500]}
+
+def parse_duckduckgo(page: str) -> List[Dict[str, Any]]:
+    doc = _parse_document(page)
+    if doc is None:
+        return []
+    results = []
+    # DuckDuckGo tem estrutura simples
+    for div in _DDG_RESULTS(doc)[:20]:
+        title_elem = _first(_DDG_TITLE(div))
+        if title_elem is not None:
+            snippet_elem = _first(_DDG_SNIPPET(div))
+            results.append(_serp_record("DuckDuckGo", _text(title_elem), _text(snippet_elem), title_elem.get('href', '')))
+    return results
+
+def parse_bing(page: str) -> List[Dict[str, Any]]:
+    doc = _parse_document(page)
+    if doc is None:
+        return []
+    results = []
+    # Bing usa class 'b_algo'
+    for div in _BING_RESULTS(doc)[:20]:
+        title_elem = _first(_FIRST_H2(div))
+        if title_elem is not None:
+            # <p> tem prioridade sobre div.b_caption, independente da ordem no documento
+            snippets = _BING_SNIPPET(div)
+            snippet_elem = next((e for e in snippets if e.tag == 'p'), _first(snippets))
+            link_elem = _first(_FIRST_LINK(div))
+            results.append(_serp_record("Bing", _text(title_elem), _text(snippet_elem), link_elem.get('href') if link_elem is not None else ""))
+    return results
+
+def parse_google(page: str) -> List[Dict[str, Any]]:
+    doc = _parse_document(page)
+    if doc is None:
+        return []
+    results = []
+    # Múltiplos seletores do Google
+    search_divs = []
+    for selector in _GOOGLE_RESULTS:
+        search_divs = selector(doc)
+        if search_divs:
+            break
+    for div in search_divs[:20]:
+        title_elem = _first(_FIRST_H3(div))
+        if title_elem is not None:
+            snippets = _GOOGLE_SNIPPET(div)
+            snippet_elem = next((e for e in snippets if e.tag == 'div'), _first(snippets))
+            link_elem = _first(_FIRST_LINK(div))
+            url = link_elem.get('href') if link_elem is not None else ""
+            results.append(_serp_record("Google", _text(title_elem), _text(snippet_elem), url))
+    return results
+
+SERP_PARSERS = {"DuckDuckGo": parse_duckduckgo, "Bing": parse_bing, "Google": parse_google}
+parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="serp-parse")
+
+# ANÁLISE (extratores plugáveis executados em uma única passada sobre os resultados)
+class AnalyzedResult:
+    """Resultado com os textos em minúsculas calculados uma única vez"""
+    __slots__ = ("result", "text", "snippet_lower", "keywords")
+    
+    def __init__(self, result: Dict[str, Any], text: str, snippet_lower: str, keywords: frozenset):
+        self.result = result
+        self.text = text
+        self.snippet_lower = snippet_lower
+        self.keywords = keywords
+
+class KeywordMatcher:
+    """Verifica de uma vez todas as palavras-chave de todos os extratores em um texto"""
+    def __init__(self, keywords):
+        self.keywords = tuple(dict.fromkeys(keywords))
+    
+    def find(self, text: str) -> frozenset:
+        return frozenset(filter(text.__contains__, self.keywords))
+
+class ResultExtractor:
+    """Base dos extratores: feed() recebe cada resultado, finish() recebe o texto completo e devolve as seções"""
+    keywords: tuple = ()
+    
+    def feed(self, index: int, item: AnalyzedResult):
+        pass
+    
+    def finish(self, all_text: str) -> Dict[str, Any]:
+        return {}
+
+class ProcessosExtractor(ResultExtractor):
+    keywords = ('processo', 'tribunal', 'juiz', 'ação', 'sentença')
+    
+    def __init__(self):
+        self.processos = []
+    
+    def feed(self, index, item):
+        if not item.keywords.isdisjoint(self.keywords):
+            result = item.result
+            self.processos.append({
+                "type": "Processo Judicial",
+                "title": result['title'][:250],
+                "description": result['snippet'][:400],
+                "source": result['engine'],
+                "url": result['url']
+            })
+    
+    def finish(self, all_text):
         processo_count = 0
-        
-        processo_patterns = [r'(\d+)\s*processo[s]?', r'(\d{7}-\d{2}\.\d{4}\.\d\.\d{2}\.\d{4})']
-        
-        for pattern in processo_patterns:
-            matches = re.findall(pattern, all_text)
-            for match in matches:
-                if isinstance(match, str) and match.isdigit():
-                    num = int(match)
-                    if 0 < num < 1000 and num > processo_count:
-                        processo_count = num
-        
-        for result in all_results:
-            text = result['title'] + " " + result['snippet']
-            if any(word in text.lower() for word in ['processo', 'tribunal', 'juiz', 'ação', 'sentença']):
-                processos.append({
-                    "type": "Processo Judicial",
-                    "title": result['title'][:250],
-                    "description": result['snippet'][:400],
-                    "source": result['engine'],
-                    "url": result['url']
-                })
+        # Equivale a re.findall(r'(\d+)\s*processo[s]?', all_text): parte de cada
+        # ocorrência literal de "processo" e lê espaços e dígitos para trás.
+        # O antigo padrão de número CNJ nunca contava (o grupo tem '-' e '.')
+        start = all_text.find('processo')
+        while start != -1:
+            digits_end = start
+            while digits_end > 0 and all_text[digits_end - 1].isspace():
+                digits_end -= 1
+            digits_start = digits_end
+            while digits_start > 0 and all_text[digits_start - 1].isdecimal():
+                digits_start -= 1
+            if digits_start < digits_end:
+                num = int(all_text[digits_start:digits_end])
+                if 0 < num < 1000 and num > processo_count:
+                    processo_count = num
+            start = all_text.find('processo', start + len('processo'))
         
         if processo_count > 0:
-            processos.insert(0, {
+            self.processos.insert(0, {
                 "type": "📊 RESUMO",
                 "title": f"⚖️ {processo_count} PROCESSO(S) IDENTIFICADO(S)",
-                "description": f"Total: {len(processos)} registros encontrados",
+                "description": f"Total: {len(self.processos)} registros encontrados",
                 "source": "Análise Multi-Engine"
             })
-        
-        print(f"✅ {len(processos)} processos")
-        
-        print("🏢 Analisando empresas...")
-        empresas = []
-        
-        cnpj_pattern = r'\d{2}\.?\d{3}\.?\d{3}[/]?\d{4}[-]?\d{2}'
-        cnpjs = re.findall(cnpj_pattern, all_text)
-        
-        for cnpj in list(set(cnpjs))[:10]:
-            empresas.append({
-                "type": "🏢 CNPJ",
-                "company": f"CNPJ: {cnpj}",
-                "cnpj": cnpj,
-                "source": "Multi-Engine"
+        return {"processos": self.processos, "processo_count": processo_count}
+
+class EmpresasExtractor(ResultExtractor):
+    keywords = ('cnpj', 'empresa', 'sócio', 'mei', 'ltda')
+    cnpj_pattern = re.compile(r'\d{2}\.?\d{3}\.?\d{3}[/]?\d{4}[-]?\d{2}')
+    
+    def __init__(self):
+        self.vinculos = []
+    
+    def feed(self, index, item):
+        if not item.keywords.isdisjoint(self.keywords):
+            result = item.result
+            self.vinculos.append({
+                "type": "💼 Vínculo Empresarial",
+                "company": result['title'][:200],
+                "details": result['snippet'][:300],
+                "source": result['engine'],
+                "url": result['url']
             })
-        
-        for result in all_results:
-            text = result['title'] + " " + result['snippet']
-            if any(word in text.lower() for word in ['cnpj', 'empresa', 'sócio', 'mei', 'ltda']):
-                empresas.append({
-                    "type": "💼 Vínculo Empresarial",
-                    "company": result['title'][:200],
-                    "details": result['snippet'][:300],
-                    "source": result['engine'],
-                    "url": result['url']
-                })
-        
-        print(f"✅ {len(empresas)} empresas")
-        
-        print("📱 Analisando redes sociais...")
+    
+    def finish(self, all_text):
+        cnpjs = self.cnpj_pattern.findall(all_text)
+        empresas = [{
+            "type": "🏢 CNPJ",
+            "company": f"CNPJ: {cnpj}",
+            "cnpj": cnpj,
+            "source": "Multi-Engine"
+        } for cnpj in list(set(cnpjs))[:10]]
+        return {"empresas": empresas + self.vinculos}
+
+class SocialMediaExtractor(ResultExtractor):
+    linkedin_pattern = re.compile(r'linkedin\.com/in/([\w-]+)')
+    facebook_pattern = re.compile(r'facebook\.com/([\w.]+)')
+    instagram_pattern = re.compile(r'instagram\.com/([\w.]+)')
+    
+    def finish(self, all_text):
         social_media = []
         
-        linkedin_urls = re.findall(r'linkedin\.com/in/([\w-]+)', all_text)
-        for username in set(linkedin_urls[:5]):
+        for username in set(self.linkedin_pattern.findall(all_text)[:5]):
             social_media.append({
                 "platform": "💼 LinkedIn",
                 "profile": username,
@@ -390,8 +1084,7 @@ class MultiSearchEngine:
                 "status": "Perfil encontrado"
             })
         
-        facebook_urls = re.findall(r'facebook\.com/([\w.]+)', all_text)
-        for username in set(facebook_urls[:5]):
+        for username in set(self.facebook_pattern.findall(all_text)[:5]):
             if username not in ['pages', 'groups', 'watch', 'share']:
                 social_media.append({
                     "platform": "📘 Facebook",
@@ -400,81 +1093,560 @@ class MultiSearchEngine:
                     "status": "Perfil encontrado"
                 })
         
-        instagram_urls = re.findall(r'instagram\.com/([\w.]+)', all_text)
-        for username in set(instagram_urls[:5]):
-            if username not in ['explore', 'p', 'reel']:
-                social_media.append({
-                    "platform": "📷 Instagram",
-                    "profile": f"@{username}",
-                    "url": f"https://www.instagram.com/{username}",
-                    "status": "Perfil encontrado"
-                })
+        for username in set(self.instagram_pattern.findall(all_text)[:5]):
+            if username not in ['explore', 'p', 'reel']:
+                social_media.append({
+                    "platform": "📷 Instagram",
+                    "profile": f"@{username}",
+                    "url": f"https://www.instagram.com/{username}",
+                    "status": "Perfil encontrado"
+                })
+        
+        return {"social_media": social_media}
+
+class FamilyExtractor(ResultExtractor):
+    family_keywords = {'filho': '👦 Filho', 'filha': '👧 Filha', 'pai': '👨 Pai', 'mãe': '👩 Mãe', 'esposa': '💑 Esposa', 'irmão': '👬 Irmão', 'irmã': '👭 Irmã'}
+    keywords = tuple(family_keywords)
+    limit = 8
+    
+    def __init__(self):
+        self.family_info = []
+    
+    def feed(self, index, item):
+        if len(self.family_info) >= self.limit or item.keywords.isdisjoint(self.keywords):
+            return
+        for keyword, tipo in self.family_keywords.items():
+            if keyword in item.keywords:
+                self.family_info.append({
+                    "type": tipo,
+                    "details": item.result['snippet'][:250],
+                    "source": item.result['engine']
+                })
+                if len(self.family_info) >= self.limit: break
+    
+    def finish(self, all_text):
+        return {"family_info": self.family_info}
+
+class PublicRecordsExtractor(ResultExtractor):
+    limit = 30
+    news_sites = ('g1.com', 'uol.com', 'folha', 'estadao', 'globo')
+    sports_words = ('atleta', 'esporte', 'competição', 'campeonato')
+    
+    def __init__(self):
+        self.public_records = []
+    
+    def feed(self, index, item):
+        if index >= self.limit:
+            return
+        result = item.result
+        categoria = "📋 Menção"
+        url_lower = result['url'].lower()
+        if any(w in url_lower for w in self.news_sites):
+            categoria = "📰 Notícia"
+        elif any(w in item.snippet_lower for w in self.sports_words):
+            categoria = "🏃 Esporte"
+        
+        self.public_records.append({
+            "source": categoria,
+            "title": result['title'][:200],
+            "snippet": result['snippet'][:350],
+            "url": result['url'],
+            "engine": result['engine']
+        })
+    
+    def finish(self, all_text):
+        return {"public_records": self.public_records}
+
+class AnalysisPipeline:
+    """Executa todos os extratores em uma passada: cada título/snippet é convertido para minúsculas uma vez"""
+    def __init__(self, extractor_classes: List[type]):
+        self.extractor_classes = list(extractor_classes)
+        self.matcher = KeywordMatcher(k for cls in self.extractor_classes for k in cls.keywords)
+    
+    def run(self, results: List[Dict[str, Any]], record_metrics: bool = True) -> Dict[str, Any]:
+        """record_metrics=False para execuções auxiliares (prévias do stream) que não devem entrar em STAGE_SECONDS"""
+        extractors = [cls() for cls in self.extractor_classes]
+        # Tempo por extrator acumulado na passada e registrado uma vez no fim
+        elapsed = [0.0] * len(extractors)
+        clock = time.perf_counter
+        start = clock()
+        texts = []
+        for index, result in enumerate(results):
+            snippet_lower = result['snippet'].lower()
+            text = result['title'].lower() + " " + snippet_lower
+            texts.append(text)
+            item = AnalyzedResult(result, text, snippet_lower, self.matcher.find(text))
+            for position, extractor in enumerate(extractors):
+                t0 = clock()
+                extractor.feed(index, item)
+                elapsed[position] += clock() - t0
+        
+        all_text = " " + " ".join(texts) if texts else ""
+        output: Dict[str, Any] = {}
+        for position, extractor in enumerate(extractors):
+            t0 = clock()
+            output.update(extractor.finish(all_text))
+            elapsed[position] += clock() - t0
+        if record_metrics:
+            for extractor, seconds in zip(extractors, elapsed):
+                STAGE_SECONDS.labels("analysis", type(extractor).__name__).observe(seconds)
+            STAGE_SECONDS.labels("analysis", "total").observe(clock() - start)
+        return output
+
+ANALYSIS_EXTRACTORS = [ProcessosExtractor, EmpresasExtractor, SocialMediaExtractor, FamilyExtractor, PublicRecordsExtractor]
+analysis_pipeline = AnalysisPipeline(ANALYSIS_EXTRACTORS)
+
+# PLANEJADOR DE QUERIES: (template, query, seções da análise que a query alimenta)
+QUERY_TEMPLATES = (
+    ("base", '"{term}"', ()),
+    ("brasil", '"{term}" Brasil', ("public_records",)),
+    ("processos", '"{term}" processos judiciais', ("processos",)),
+    ("empresas", '"{term}" CNPJ empresa', ("empresas",)),
+    ("linkedin", '"{term}" LinkedIn', ("social_media", "empresas")),
+    ("redes_sociais", '"{term}" redes sociais', ("social_media",)),
+)
+
+class QueryPlan:
+    """Decide quais templates disparar numa busca, tratando cada requisição upstream como custo.
+    
+    A query base roda sozinha primeiro. Com menos de PLANNER_RARE_RESULTS resultados vindos de motores que
+    responderam o nome é raro e os templates (mais específicos que ela) são pulados; se nenhum motor
+    respondeu (falha ou prazo), o zero não diz nada sobre o nome e o plano segue. Os demais saem em ondas
+    de até PLANNER_WAVE_SIZE, reavaliadas a cada onda: um template é pulado quando todas as suas seções já
+    têm PLANNER_SECTION_TARGET itens ou quando o custo estimado (motores sem a query em cache) estouraria o
+    orçamento. O fallback (Google) de cada query só é liberado ("fallback" no step) se couber no que sobra.
+    """
+    def __init__(self, term: str, budget: int = SEARCH_REQUEST_BUDGET, section_target: int = PLANNER_SECTION_TARGET,
+                 wave_size: int = PLANNER_WAVE_SIZE, rare_results: int = PLANNER_RARE_RESULTS, deadline: float = SEARCH_DEADLINE):
+        self.budget = budget
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.section_target = section_target
+        self.wave_size = max(1, wave_size)
+        self.rare_results = rare_results
+        self.requests = 0
+        self.steps = [{"template": key, "query": template.format(term=term), "targets": targets, "status": "pending"}
+                      for key, template, targets in QUERY_TEMPLATES]
+    
+    def skip(self, step: dict, reason: str):
+        step.update(status="skipped", reason=reason)
+        PLANNER_QUERIES.labels(step["template"], "skipped").inc()
+    
+    def next_wave(self, analysis: Dict[str, Any], cost: Callable[[str], int], fallback_cost: Callable[[str], int] = lambda query: 0) -> List[dict]:
+        """Próximas queries a disparar; lista vazia encerra a busca"""
+        base, pending = self.steps[0], [step for step in self.steps[1:] if step["status"] == "pending"]
+        if base["status"] == "pending":
+            return self._grant_fallback([base], cost(base["query"]), fallback_cost)
+        answered = any(engine["status"] in ("ok", "empty") for engine in base.get("engines", {}).values())
+        if pending and answered and base["results"] < self.rare_results:
+            for step in pending:
+                self.skip(step, "nome raro")
+            return []
+        wave: List[dict] = []
+        reserved = 0
+        for step in pending:
+            if len(wave) == self.wave_size:
+                break
+            if self.section_target and all(len(analysis.get(section, ())) >= self.section_target for section in step["targets"]):
+                self.skip(step, "seções saturadas")
+                continue
+            estimate = cost(step["query"])
+            if self.budget and self.requests + reserved + estimate > self.budget:
+                self.skip(step, "orçamento esgotado")
+                continue
+            reserved += estimate
+            wave.append(step)
+        return self._grant_fallback(wave, reserved, fallback_cost)
+    
+    def _grant_fallback(self, wave: List[dict], reserved: int, fallback_cost: Callable[[str], int]) -> List[dict]:
+        spare = self.budget - self.requests - reserved if self.budget else None
+        for step in wave:
+            extra = fallback_cost(step["query"])
+            step["fallback"] = spare is None or extra <= spare
+            if step["fallback"] and spare is not None:
+                spare -= extra
+        return wave
+    
+    def remaining(self) -> Optional[float]:
+        """Segundos até o prazo da busca; None = sem prazo"""
+        return self.deadline - (time.monotonic() - self.started) if self.deadline > 0 else None
+    
+    def expire(self):
+        for step in self.steps:
+            if step["status"] == "pending":
+                self.skip(step, "prazo esgotado")
+    
+    def record(self, step: dict, results: List[Dict[str, Any]], timed_out: bool = False):
+        engines = step.get("engines", {}).values()
+        if timed_out:
+            status = "timed_out"
+        elif engines and all(engine["status"] == "failed" for engine in engines):
+            status = "failed"
+        else:
+            status = "ran"
+        step.update(status=status, results=len(results))
+        self.requests += step.setdefault("requests", 0)
+        PLANNER_QUERIES.labels(step["template"], status).inc()
+    
+    def completeness(self) -> Dict[str, Any]:
+        """Resumo do que a busca cobriu: queries e motores por desfecho, se o prazo cortou a busca e se
+        algum motor chegou a responder (answered=False: os resultados vazios são falha, não ausência)"""
+        queries: Dict[str, int] = {}
+        engines: Dict[str, Dict[str, int]] = {}
+        for step in self.steps:
+            status = "deadline" if step.get("reason") == "prazo esgotado" else step["status"]
+            queries[status] = queries.get(status, 0) + 1
+            for engine, outcome in step.get("engines", {}).items():
+                counts = engines.setdefault(engine, {})
+                counts[outcome["status"]] = counts.get(outcome["status"], 0) + 1
+        timed_out = bool(queries.get("timed_out") or queries.get("deadline"))
+        return {
+            "complete": not timed_out and not queries.get("failed") and not any(counts.get("failed") for counts in engines.values()),
+            "timed_out": timed_out,
+            "answered": any(counts.get("ok") or counts.get("empty") for counts in engines.values()),
+            "deadline_seconds": self.deadline or None,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "queries": queries,
+            "engines": engines
+        }
+    
+    def report(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "requests": self.requests,
+            "queries": [{k: v for k, v in step.items() if k != "targets"} for step in self.steps]
+        }
+
+# SISTEMA MULTI-SEARCH (Google + Bing + DuckDuckGo)
+# SAÚDE DOS MOTORES
+class EngineUnavailable(Exception):
+    """Motor com circuito aberto: a requisição nem é feita"""
+
+class EngineSearchFailed(Exception):
+    """fetch/parse de uma página de resultados falhou (erro de rede, status != 200 ou circuito aberto)"""
+
+CAPTCHA_MARKERS = ("captcha", "unusual traffic", "tráfego incomum", "/sorry/", "anomaly-modal")
+
+class EngineHealth:
+    """Janela móvel de desfechos e latências (respostas 200) de um motor, com circuit breaker.
+    
+    closed: tudo passa. open: nada passa até o fim do cooldown. half_open: uma única
+    requisição de prova passa; sucesso fecha o circuito, falha reabre com cooldown dobrado.
+    """
+    FAILURES = ("error", "http_error", "blocked")
+    
+    def __init__(self, engine: str):
+        self.engine = engine
+        self.outcomes = deque(maxlen=ENGINE_HEALTH_WINDOW)
+        self.latencies = deque(maxlen=ENGINE_HEALTH_WINDOW)
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.cooldown = ENGINE_BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self.opened_count = 0
+        self.skipped = 0
+    
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if now < self.open_until:
+            self.skipped += 1
+            return False
+        # Fim do cooldown: libera uma prova e segura as demais por mais um cooldown
+        self.state = "half_open"
+        self.open_until = now + self.cooldown
+        return True
+    
+    def timeout(self) -> httpx.Timeout:
+        """Timeout de leitura = p95 observado x fator, entre ENGINE_TIMEOUT_MIN e HTTP_READ_TIMEOUT"""
+        read = HTTP_READ_TIMEOUT
+        if len(self.latencies) >= ENGINE_BREAKER_MIN_SAMPLES:
+            read = min(HTTP_READ_TIMEOUT, max(ENGINE_TIMEOUT_MIN, self.percentile(0.95) * ENGINE_TIMEOUT_FACTOR))
+        return httpx.Timeout(read, connect=HTTP_CONNECT_TIMEOUT)
+    
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+    
+    def record(self, outcome: str):
+        """outcome: ok, empty (200 sem resultados), blocked (captcha), http_error ou error"""
+        self.outcomes.append(outcome)
+        ENGINE_REQUESTS.labels(self.engine, outcome).inc()
+        if outcome not in self.FAILURES:
+            self.consecutive_failures = 0
+            if self.state == "half_open":
+                log.info("circuito fechado", extra={"engine": self.engine})
+                self.state, self.cooldown = "closed", ENGINE_BREAKER_COOLDOWN
+            return
+        self.consecutive_failures += 1
+        if self.state == "half_open":
+            self._open(min(self.cooldown * 2, ENGINE_BREAKER_MAX_COOLDOWN))
+        elif self.state == "closed" and (self.consecutive_failures >= ENGINE_BREAKER_CONSECUTIVE or (
+                len(self.outcomes) >= ENGINE_BREAKER_MIN_SAMPLES and self.failure_rate() >= ENGINE_BREAKER_FAILURE_RATE)):
+            self._open(ENGINE_BREAKER_COOLDOWN)
+    
+    def _open(self, cooldown: float):
+        self.state = "open"
+        self.cooldown = cooldown
+        self.open_until = time.monotonic() + cooldown
+        self.opened_count += 1
+        log.warning("circuito aberto", extra={"engine": self.engine, "cooldown_seconds": cooldown})
+    
+    def rate(self, *outcomes: str) -> float:
+        return sum(1 for o in self.outcomes if o in outcomes) / len(self.outcomes) if self.outcomes else 0.0
+    
+    def failure_rate(self) -> float:
+        return self.rate(*self.FAILURES)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "working": self.state != "open",
+            "samples": len(self.outcomes),
+            "success_rate": round(self.rate("ok"), 3),
+            "zero_results_rate": round(self.rate("empty"), 3),
+            "blocked_rate": round(self.rate("blocked"), 3),
+            "failure_rate": round(self.failure_rate(), 3),
+            "latency_ms": {f"p{int(q * 100)}": round(self.percentile(q) * 1000) for q in (0.5, 0.95, 0.99)},
+            "timeout_seconds": round(self.timeout().read, 2),
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(max(0.0, self.open_until - time.monotonic()), 1) if self.state != "closed" else 0,
+            "times_opened": self.opened_count,
+            "skipped_requests": self.skipped,
+        }
+
+class MultiSearchEngine:
+    ENGINES = ("DuckDuckGo", "Bing", "Google")
+    
+    def __init__(self):
+        self.timeout = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE, keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        # Transporte alternativo (ex.: servidor local dos benchmarks); None = rede real
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+        self.limiter = create_engine_limiter(ENGINE_LIMITS_BACKEND, self.ENGINES)
+        self.health = {engine: EngineHealth(engine) for engine in self.ENGINES}
+        self.serp_cache = SerpCache(SERP_CACHE_TTL, SERP_CACHE_MAX_ENTRIES)
+        self.user_agents = [
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
+        ]
+    
+    def get_headers(self):
+        return {
+            'User-Agent': random.choice(self.user_agents),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+        }
+    
+    def get_client(self, engine: str) -> httpx.AsyncClient:
+        """Um AsyncClient por motor: cada host mantém seu próprio pool keep-alive"""
+        http_client = self._clients.get(engine)
+        if http_client is None or http_client.is_closed:
+            # httpx decodifica gzip/deflate nativamente e br via pacote 'brotli'
+            http_client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, follow_redirects=True, transport=self.transport)
+            self._clients[engine] = http_client
+        return http_client
+    
+    async def fetch(self, engine: str, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """Requisição com limites de cortesia; falhas e status != 200 entram na saúde do motor"""
+        health = self.health[engine]
+        if not health.allow():
+            raise EngineUnavailable(f"{engine} em pausa (circuito aberto)")
+        async with self.limiter.slot(engine):
+            start = time.monotonic()
+            try:
+                with span("fetch", engine):
+                    response = await self.get_client(engine).get(url, headers=headers if headers is not None else self.get_headers(), timeout=health.timeout())
+            except Exception:
+                health.record("error")
+                raise
+        if response.status_code != 200:
+            health.record("http_error")
+        else:
+            health.latencies.append(time.monotonic() - start)
+        return response
+    
+    async def parse(self, engine: str, response: httpx.Response) -> List[Dict[str, Any]]:
+        """Parse fora do event loop; o número de resultados completa o registro de saúde da requisição"""
+        page = response.text
+        with span("parse", engine):
+            results = await asyncio.get_running_loop().run_in_executor(parse_executor, SERP_PARSERS[engine], page)
+        ENGINE_RESULTS.labels(engine).inc(len(results))
+        if results:
+            outcome = "ok"
+        else:
+            page_lower = page[:20000].lower()
+            outcome = "blocked" if any(marker in page_lower for marker in CAPTCHA_MARKERS) else "empty"
+        self.health[engine].record(outcome)
+        return results
+    
+    def get_engine_stats(self) -> Dict[str, Any]:
+        return {engine: health.get_stats() for engine, health in self.health.items()}
+    
+    async def close(self):
+        for http_client in self._clients.values():
+            await http_client.aclose()
+        self._clients.clear()
+    
+    async def search_engine(self, engine: str, url: str) -> List[Dict[str, Any]]:
+        """fetch + parse de uma página de resultados; qualquer falha vira EngineSearchFailed"""
+        try:
+            response = await self.fetch(engine, url)
+        except EngineUnavailable as e:
+            log.debug("motor em pausa", extra={"engine": engine})
+            raise EngineSearchFailed(str(e)) from e
+        except Exception as e:
+            log.warning("falha na busca do motor", extra={"engine": engine, "error": str(e)[:100]})
+            raise EngineSearchFailed(f"{type(e).__name__}: {str(e)[:100]}") from e
+        if response.status_code != 200:
+            log.warning("motor respondeu com erro", extra={"engine": engine, "status": response.status_code})
+            raise EngineSearchFailed(f"HTTP {response.status_code}")
+        try:
+            results = await self.parse(engine, response)
+        except Exception as e:
+            log.warning("falha no parse do motor", extra={"engine": engine, "error": str(e)[:100]})
+            raise EngineSearchFailed(f"parse: {str(e)[:100]}") from e
+        log.debug("resultados do motor", extra={"engine": engine, "results": len(results)})
+        return results
+    
+    @serp_cached("DuckDuckGo")
+    async def search_duckduckgo(self, query: str) -> List[Dict[str, Any]]:
+        """DuckDuckGo - HTML simples sem JavaScript"""
+        return await self.search_engine('DuckDuckGo', f'https://html.duckduckgo.com/html/?q={quote(query)}')
+    
+    @serp_cached("Bing")
+    async def search_bing(self, query: str) -> List[Dict[str, Any]]:
+        """Bing - Alternativa ao Google"""
+        return await self.search_engine('Bing', f'https://www.bing.com/search?q={quote(query)}&count=30&setlang=pt-BR')
+    
+    @serp_cached("Google")
+    async def search_google(self, query: str) -> List[Dict[str, Any]]:
+        """Google - Tentativa com múltiplos seletores"""
+        return await self.search_engine('Google', f'https://www.google.com/search?q={quote(query)}&num=30&hl=pt-BR')
+    
+    def query_cost(self, query: str) -> int:
+        """Requisições upstream que a query custaria nos motores principais (o Google é só fallback)"""
+        return sum(not self.serp_cache.is_fresh(engine, query) for engine in ("DuckDuckGo", "Bing"))
+    
+    def fallback_cost(self, query: str) -> int:
+        """Requisição extra que o fallback do Google custaria, se for acionado"""
+        return int(not self.serp_cache.is_fresh("Google", query))
+    
+    async def search_multi_engine(self, query: str, on_batch: Optional[Callable] = None, step: Optional[dict] = None) -> List[Dict[str, Any]]:
+        """Busca em TODOS os motores e combina resultados; on_batch(query, engine, results) é chamado a cada motor concluído.
+        Se step for dado, registra nele o desfecho de cada motor (ok/empty/failed/timed_out) e as requisições upstream feitas"""
+        engines = step.setdefault("engines", {}) if step is not None else {}
+        
+        async def engine_search(engine: str, method) -> List[Dict[str, Any]]:
+            if step is not None:
+                step["requests"] = step.get("requests", 0) + (not self.serp_cache.is_fresh(engine, query))
+            try:
+                results = await method(query)
+            except EngineSearchFailed as e:
+                engines[engine] = {"status": "failed", "error": str(e)}
+                results = []
+            except asyncio.CancelledError:
+                engines[engine] = {"status": "timed_out"}
+                raise
+            else:
+                engines[engine] = {"status": "ok" if results else "empty", "results": len(results)}
+            if on_batch:
+                on_batch(query, engine, results)
+            return results
         
-        print(f"✅ {len(social_media)} perfis")
+        # ESTRATÉGIA: DuckDuckGo e Bing em paralelo; o espaçamento entre
+        # requisições fica a cargo dos limites por motor em fetch()
+        duckduckgo_results, bing_results = await asyncio.gather(
+            engine_search("DuckDuckGo", self.search_duckduckgo),
+            engine_search("Bing", self.search_bing),
+        )
+        all_results = duckduckgo_results + bing_results
         
-        print("👥 Analisando família...")
-        family_info = []
-        family_keywords = {'filho': '👦 Filho', 'filha': '👧 Filha', 'pai': '👨 Pai', 'mãe': '👩 Mãe', 'esposa': '💑 Esposa', 'irmão': '👬 Irmão', 'irmã': '👭 Irmã'}
+        # Google (se os outros falharem e o plano tiver orçamento para ele)
+        if len(all_results) < 5 and (step is None or step.get("fallback", True)):
+            google_results = await engine_search("Google", self.search_google)
+            all_results.extend(google_results)
         
-        for result in all_results:
-            text = result['title'] + " " + result['snippet']
-            for keyword, tipo in family_keywords.items():
-                if keyword in text.lower():
-                    family_info.append({
-                        "type": tipo,
-                        "details": result['snippet'][:250],
-                        "source": result['engine']
-                    })
-                    if len(family_info) >= 8: break
-            if len(family_info) >= 8: break
+        log.debug("query concluída", extra={"query": query, "results": len(all_results)})
+        return all_results
+    
+    async def extract_info_multi_engine(self, name: str, on_batch: Optional[Callable] = None) -> Dict[str, Any]:
+        """BUSCA com múltiplos motores (DuckDuckGo, Bing, Google)"""
         
-        print(f"✅ {len(family_info)} menções familiares")
+        plan = QueryPlan(name)
+        merger = SerpResultMerger()
+        analysis = analysis_pipeline.run([])
+        # Resultados por query na ordem de chegada dos motores: é o que sobra de uma query cortada pelo prazo
+        arrived: Dict[str, List[Dict[str, Any]]] = {}
         
-        print("📰 Outras informações...")
-        public_records = []
+        def collect(query: str, engine: str, results: List[Dict[str, Any]]):
+            arrived.setdefault(query, []).extend(results)
+            if on_batch:
+                on_batch(query, engine, results)
         
-        for result in all_results[:30]:
-            categoria = "📋 Menção"
-            if any(w in result['url'].lower() for w in ['g1.com', 'uol.com', 'folha', 'estadao', 'globo']):
-                categoria = "📰 Notícia"
-            elif any(w in result['snippet'].lower() for w in ['atleta', 'esporte', 'competição', 'campeonato']):
-                categoria = "🏃 Esporte"
-            
-            public_records.append({
-                "source": categoria,
-                "title": result['title'][:200],
-                "snippet": result['snippet'][:350],
-                "url": result['url'],
-                "engine": result['engine']
-            })
+        # Queries de uma onda saem juntas; a análise parcial decide a onda seguinte
+        while wave := plan.next_wave(analysis, self.query_cost, self.fallback_cost):
+            remaining = plan.remaining()
+            if remaining is not None and remaining <= 0:
+                plan.expire()
+                break
+            tasks = [asyncio.ensure_future(self.search_multi_engine(step["query"], collect, step)) for step in wave]
+            try:
+                done, late = await asyncio.wait(tasks, timeout=remaining)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            if late:
+                await asyncio.gather(*late, return_exceptions=True)
+            with span("merge"):
+                for step, task in zip(wave, tasks):
+                    results = task.result() if task in done else arrived.get(step["query"], [])
+                    plan.record(step, results, timed_out=task not in done)
+                    merger.add(step["query"], results)
+            analysis = analysis_pipeline.run(merger.results)
+            if late:
+                log.info("prazo da busca esgotado", extra={"term": name, "deadline": plan.deadline, "late_queries": len(late)})
+                plan.expire()
+                break
+        all_results = merger.results
         
-        print(f"✅ {len(public_records)} registros")
+        log.debug("busca analisada", extra={
+            "term": name, "results": len(all_results), "duplicates": merger.duplicates,
+            "queries": sum(1 for step in plan.steps if step["status"] == "ran"), "upstream_requests": plan.requests,
+            **{section: len(analysis[section]) for section in ("processos", "empresas", "social_media", "family_info", "public_records")}
+        })
         
         return {
-            "processos": processos,
-            "processo_count": processo_count,
-            "empresas": empresas,
-            "social_media": social_media,
-            "public_records": public_records,
-            "family_info": family_info,
-            "total_results": len(all_results)
+            "processos": analysis["processos"],
+            "processo_count": analysis["processo_count"],
+            "empresas": analysis["empresas"],
+            "social_media": analysis["social_media"],
+            "public_records": analysis["public_records"],
+            "family_info": analysis["family_info"],
+            "total_results": len(all_results),
+            "query_plan": plan.report(),
+            "completeness": plan.completeness()
         }
     
-    async def search_person(self, name: Optional[str] = None, cpf: Optional[str] = None) -> Dict[str, Any]:
+    async def search_person(self, name: Optional[str] = None, cpf: Optional[str] = None, on_batch: Optional[Callable] = None) -> Dict[str, Any]:
         """Busca principal - Nome ou CPF"""
         
         if not name and not cpf:
             raise ValueError("Informe nome ou CPF")
         
         # Se tiver CPF, buscar por CPF (mais preciso)
-        if cpf:
-            print(f"🔍 Busca por CPF: {cpf}")
-            search_term = cpf
-        else:
-            print(f"🔍 Busca por Nome: {name}")
-            search_term = name
+        search_term = cpf or name
+        log.debug("busca iniciada", extra={"by": "cpf" if cpf else "name"})
         
-        extracted = await self.extract_info_multi_engine(search_term)
+        with span("search"):
+            extracted = await self.extract_info_multi_engine(search_term, on_batch)
         
         full_name = name or f"CPF {cpf}"
         
@@ -490,35 +1662,341 @@ class MultiSearchEngine:
             "family_info": extracted["family_info"] if extracted["family_info"] else [{"type": "Família", "details": "Não disponível", "note": "Requer registros civis"}],
             "public_records": extracted["public_records"] if extracted["public_records"] else [{"source": "Busca", "title": "Informações limitadas", "snippet": "Verificar outras fontes"}],
             "risk_assessment": "baixo",
+            "query_plan": extracted["query_plan"],
+            "completeness": extracted["completeness"],
             "disclaimer": "⚠️ IMPORTANTE: Informações de fontes públicas. Verificação cruzada obrigatória."
         }
 
 search_system = MultiSearchEngine()
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def search_cache_key(name: Optional[str] = None, cpf: Optional[str] = None) -> str:
+    """Chave normalizada: CPF só com dígitos; nome sem acentos, minúsculo e com espaços colapsados.
+    Com CPF e nome a chave leva os dois: o nome informado faz parte da resposta"""
+    if not name and not cpf:
+        raise ValueError("Informe nome ou CPF")
+    parts = []
+    if cpf:
+        parts.append("cpf:" + re.sub(r'\D', '', cpf))
+    if name:
+        folded = ''.join(c for c in unicodedata.normalize('NFKD', name) if not unicodedata.combining(c))
+        parts.append("name:" + ' '.join(folded.casefold().split()))
+    return "|".join(parts)
+
+class SearchResultCache:
+    """Cache de duas camadas para search_person: LRU local + coleção search_cache (sobrevive a restarts).
+
+    TTL e geração ficam em db.settings e valem para todos os workers: cada um os relê no máximo a cada
+    sync_interval segundos e, se a geração mudou (invalidação feita em outro worker), descarta a memória.
+    """
+    def __init__(self, ttl: int, maxsize: int, sync_interval: float = SEARCH_CACHE_SYNC_SECONDS):
+        self.memory = TTLCache(maxsize, ttl)
+        self.sync_interval = sync_interval
+        self.generation = 0
+        self.synced_at: Optional[float] = None
+    
+    @property
+    def ttl(self) -> int:
+        return self.memory.ttl
+    
+    @ttl.setter
+    def ttl(self, value: int):
+        self.memory.ttl = value
+    
+    async def load_settings(self):
+        self.synced_at = time.monotonic()
+        settings = await db.settings.find_one({"_id": "search_cache"}) or {}
+        if "ttl_seconds" in settings:
+            self.ttl = settings["ttl_seconds"]
+        generation = settings.get("generation", 0)
+        if generation != self.generation:
+            self.memory.clear()
+            self.generation = generation
+    
+    async def sync(self):
+        if self.synced_at is not None and time.monotonic() - self.synced_at < self.sync_interval:
+            return
+        try:
+            await self.load_settings()
+        except Exception as e:
+            log.warning("configuração do cache indisponível", extra={"error": str(e)[:100]})
+    
+    async def get(self, key: str) -> Optional[tuple]:
+        """Retorna (stored_at, results) da memória ou do Mongo, respeitando o TTL atual"""
+        await self.sync()
+        entry = self.memory.get_entry(key)
+        if entry:
+            return entry
+        try:
+            doc = await db.search_cache.find_one({"_id": key})
+        except Exception as e:
+            log.warning("cache Mongo indisponível", extra={"error": str(e)[:100]})
+            return None
+        if not doc:
+            return None
+        stored_at = as_utc(doc["created_at"]).timestamp()
+        if time.time() - stored_at >= self.ttl:
+            return None
+        self.memory.set(key, doc["results"], stored_at)
+        return stored_at, doc["results"]
+    
+    async def set(self, key: str, results: Dict[str, Any]):
+        now = datetime.now(timezone.utc)
+        self.memory.set(key, results, now.timestamp())
+        try:
+            await db.search_cache.replace_one({"_id": key}, {"results": results, "created_at": now}, upsert=True)
+        except Exception as e:
+            log.warning("falha ao gravar cache", extra={"error": str(e)[:100]})
+    
+    async def invalidate(self, key: Optional[str] = None) -> int:
+        """Remove do Mongo e avança a geração, o que faz os outros workers descartarem a memória"""
+        if key is None:
+            self.memory.clear()
+            removed = (await db.search_cache.delete_many({})).deleted_count
+        else:
+            self.memory.pop(key)
+            removed = (await db.search_cache.delete_one({"_id": key})).deleted_count
+        settings = await db.settings.find_one_and_update(
+            {"_id": "search_cache"}, {"$inc": {"generation": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self.generation = settings["generation"]
+        return removed
+
+search_cache = SearchResultCache(SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES)
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+class PasswordHasher:
+    """Executa bcrypt fora do event loop, em um pool limitado; acima da capacidade rejeita com 503"""
+    def __init__(self, workers: int, queue_limit: int, rounds: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.capacity = workers + queue_limit
+        self.rounds = rounds
+        self.pending = 0
+        self.rejected = 0
+        self._rehash_tasks: set = set()
+    
+    async def _run(self, fn, *args):
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente", headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+    
+    async def hash(self, password: str) -> str:
+        with span("bcrypt", "hash"):
+            return await self._run(hash_password, password, self.rounds)
+    
+    async def verify(self, password: str, hashed: str) -> bool:
+        with span("bcrypt", "verify"):
+            return await self._run(verify_password, password, hashed)
+    
+    def needs_rehash(self, hashed: str) -> bool:
+        """Hashes bcrypt têm o formato $2b$<custo>$..."""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+    
+    def schedule_rehash(self, user_id: str, password: str):
+        """Regrava o hash com o custo atual em background, sem atrasar o login"""
+        async def rehash():
+            try:
+                await update_user({"_id": user_id}, {"$set": {"password": await self.hash(password)}})
+            except HTTPException:
+                pass  # pool saturado: tenta de novo no próximo login
+        task = asyncio.create_task(rehash())
+        self._rehash_tasks.add(task)
+        task.add_done_callback(self._rehash_tasks.discard)
+
+password_hasher = PasswordHasher(PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT, BCRYPT_ROUNDS)
+
 def create_jwt_token(user_data: dict) -> str:
     payload = {"user_id": user_data["_id"], "email": user_data["email"], "exp": datetime.utcnow() + timedelta(days=30)}
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
+class UserCache:
+    """Cache curto de documentos de usuário por user_id e de payloads de tokens já verificados.
+
+    O cache é por processo: store/invalidate só valem para o worker que fez a escrita, e os demais
+    enxergam a mudança quando a entrada expira (USER_CACHE_TTL). Por isso o documento em cache serve
+    para autenticar e exibir saldo, nunca para decidir cobrança: reserve_credit debita no Mongo.
+    """
+    def __init__(self, user_ttl: int, token_ttl: int, maxsize: int):
+        self.users = TTLCache(maxsize, user_ttl)
+        self.tokens = TTLCache(maxsize, token_ttl)
+        self.stats = {"user_hits": 0, "user_misses": 0, "token_hits": 0, "token_misses": 0}
+    
+    def decode_token(self, token: str) -> dict:
+        payload = self.tokens.get(token)
+        # Token em cache já teve a assinatura verificada; só a expiração é conferida de novo
+        if payload is not None and payload["exp"] > time.time():
+            self.stats["token_hits"] += 1
+            return payload
+        self.stats["token_misses"] += 1
+        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        self.tokens.set(token, payload)
+        return payload
+    
+    async def get_user(self, user_id: str) -> Optional[dict]:
+        user = self.users.get(user_id)
+        if user is not None:
+            self.stats["user_hits"] += 1
+            return user
+        self.stats["user_misses"] += 1
+        user = await db.users.find_one({"_id": user_id})
+        if user:
+            self.users.set(user_id, user)
+        return user
+    
+    def store(self, user: dict):
+        self.users.set(user["_id"], user)
+    
+    def invalidate(self, user_id: str):
+        self.users.pop(user_id)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        def rate(hits, misses):
+            return hits / (hits + misses) if hits + misses else 0
+        return {
+            **self.stats,
+            "user_hit_rate": rate(self.stats["user_hits"], self.stats["user_misses"]),
+            "token_hit_rate": rate(self.stats["token_hits"], self.stats["token_misses"]),
+            "cached_users": len(self.users),
+            "cached_tokens": len(self.tokens),
+            "user_ttl_seconds": self.users.ttl
+        }
+
+user_cache = UserCache(USER_CACHE_TTL, TOKEN_CACHE_TTL, USER_CACHE_MAX_ENTRIES)
+
+async def update_user(query: dict, update: dict) -> Optional[dict]:
+    """Toda escrita em users passa por aqui: o documento atualizado substitui o do cache deste processo
+    (os outros workers podem servir a versão anterior por até USER_CACHE_TTL segundos)"""
+    user = await db.users.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    if user:
+        user_cache.store(user)
+    return user
+
+STAT_FIELDS = ("users", "searches", "purchases", "sales", "revenue")
+
+def today_key() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+async def bump_stats(**increments):
+    """Incrementa os contadores totais e o rollup do dia (coleção stats) em uma ida ao Mongo"""
+    day = today_key()
+    await db.stats.bulk_write([
+        UpdateOne({"_id": "totals"}, {"$inc": increments}, upsert=True),
+        UpdateOne({"_id": f"daily:{day}"}, {"$inc": increments, "$setOnInsert": {"date": day}}, upsert=True),
+    ], ordered=False)
+
+async def rebuild_stats() -> Dict[str, Any]:
+    """Recalcula totais e rollups diários a partir de users, searches e transactions"""
+    by_day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}
+    sales_day = {"$dateToString": {"format": "%Y-%m-%d", "date": {"$ifNull": ["$confirmed_at", "$created_at"]}}}
+    pipelines = {
+        "users": (db.users, [{"$group": {"_id": by_day, "users": {"$sum": 1}}}]),
+        "searches": (db.searches, [{"$group": {"_id": by_day, "searches": {"$sum": 1}}}]),
+        "purchases": (db.transactions, [{"$group": {"_id": by_day, "purchases": {"$sum": 1}}}]),
+        "sales": (db.transactions, [{"$match": {"status": "confirmed"}}, {"$group": {"_id": sales_day, "sales": {"$sum": 1}, "revenue": {"$sum": "$amount"}}}]),
+    }
+    daily: Dict[str, Dict[str, Any]] = {}
+    for collection, pipeline in pipelines.values():
+        async for row in collection.aggregate(pipeline):
+            day = daily.setdefault(row["_id"], {"_id": f"daily:{row['_id']}", "date": row["_id"]})
+            day.update({k: v for k, v in row.items() if k != "_id"})
+    totals = {"_id": "totals", **{field: sum(d.get(field, 0) for d in daily.values()) for field in STAT_FIELDS}}
+    # Substitui documento a documento, sem esvaziar a coleção: um bump_stats concorrente não derruba o rebuild
+    # (o incremento dele pode se perder; rode fora do pico)
+    operations = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in (totals, *daily.values())]
+    try:
+        await db.stats.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Upsert concorrente do mesmo _id: o documento agora existe e a substituição passa
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        await db.stats.bulk_write([operations[err["index"]] for err in e.details["writeErrors"]], ordered=False)
+    # Rollups de dias que não aparecem mais nos dados de origem
+    await db.stats.delete_many({"_id": {"$regex": "^daily:", "$nin": [doc["_id"] for doc in daily.values()]}})
+    log.info("estatísticas recalculadas", extra={"days": len(daily)})
+    return totals
+
+def ledger_entry(user_id: str, delta: int, kind: str, ref: str, part: Optional[str] = None) -> dict:
+    """Lançamento em credit_ledger; o _id kind:ref[:part] impede lançar duas vezes o mesmo evento.
+    
+    part separa devoluções parciais de uma mesma reserva (ex.: cada job de um lote); ref continua
+    sendo o da reserva, para que toda devolução aponte para o reserve:ref que ela compensa"""
+    entry = {"_id": f"{kind}:{ref}:{part}" if part else f"{kind}:{ref}", "user_id": user_id, "delta": delta, "kind": kind, "ref": ref, "created_at": datetime.now(timezone.utc)}
+    if part:
+        entry["part"] = part
+    return entry
+
+async def reserve_credit(user_id: str, ref: str, amount: int = 1) -> dict:
+    """Debita os créditos atomicamente antes de qualquer acesso à rede; sem saldo devolve 400"""
+    user = await update_user({"_id": user_id, "credits": {"$gte": amount}}, {"$inc": {"credits": -amount}})
+    if not user:
+        raise HTTPException(status_code=400, detail="Créditos insuficientes")
+    await db.credit_ledger.insert_one(ledger_entry(user_id, -amount, "reserve", ref))
+    return user
+
+async def refund_credit(user_id: str, ref: str, amount: int = 1, part: Optional[str] = None) -> bool:
+    """Devolve os créditos reservados para ref (ou a parte part dessa reserva), no máximo uma vez"""
+    try:
+        await db.credit_ledger.insert_one(ledger_entry(user_id, amount, "refund", ref, part))
+    except DuplicateKeyError:
+        return False
+    await update_user({"_id": user_id}, {"$inc": {"credits": amount}})
+    return True
+
+async def check_credit_ledger() -> List[Dict[str, Any]]:
+    """Devoluções sem reserva correspondente, de outro usuário ou que somam mais que o reservado"""
+    totals: Dict[str, Dict[str, Any]] = {}
+    pipeline = [{"$match": {"kind": {"$in": ["reserve", "refund"]}}},
+                {"$group": {"_id": {"ref": "$ref", "kind": "$kind", "user_id": "$user_id"}, "amount": {"$sum": "$delta"}, "entries": {"$sum": 1}}}]
+    async for row in db.credit_ledger.aggregate(pipeline):
+        key = row["_id"]
+        entry = totals.setdefault(key["ref"], {"ref": key["ref"], "reserved": 0, "refunded": 0, "refunds": 0, "users": set()})
+        entry["users"].add(key["user_id"])
+        if key["kind"] == "reserve":
+            entry["reserved"] -= row["amount"]
+        else:
+            entry["refunded"] += row["amount"]
+            entry["refunds"] += row["entries"]
+    problems = []
+    for entry in totals.values():
+        if not entry["refunds"]:
+            continue
+        if not entry["reserved"]:
+            problem = "devolução sem reserva"
+        elif len(entry["users"]) > 1:
+            problem = "devolução para outro usuário"
+        elif entry["refunded"] > entry["reserved"]:
+            problem = "devolução acima do reservado"
+        else:
+            continue
+        problems.append({"ref": entry["ref"], "problem": problem, "reserved": entry["reserved"], "refunded": entry["refunded"], "users": sorted(entry["users"])})
+    return problems
+
 async def get_current_user(authorization: Optional[str] = Header(None, alias="Authorization")):
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Token necessário")
     token = authorization.split(" ")[1]
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        user = await db.users.find_one({"_id": payload["user_id"]})
-        if not user:
-            raise HTTPException(status_code=401, detail="Usuário não encontrado")
-        return user
+        payload = user_cache.decode_token(token)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Token inválido")
+    user = await user_cache.get_user(payload["user_id"])
+    if not user:
+        raise HTTPException(status_code=401, detail="Usuário não encontrado")
+    return user
 
 @app.post("/api/auth/register")
 async def register_user(user_data: UserCreate):
@@ -526,35 +2004,788 @@ async def register_user(user_data: UserCreate):
     if existing:
         raise HTTPException(status_code=400, detail="Email já cadastrado")
     user_id = str(uuid.uuid4())
-    new_user = {"_id": user_id, "email": user_data.email, "password": hash_password(user_data.password), "credits": 0, "created_at": datetime.now(timezone.utc)}
-    await db.users.insert_one(new_user)
+    new_user = {"_id": user_id, "email": user_data.email, "password": await password_hasher.hash(user_data.password), "credits": 0, "created_at": datetime.now(timezone.utc)}
+    try:
+        await db.users.insert_one(new_user)
+    except DuplicateKeyError:
+        # Dois registros simultâneos com o mesmo email: o índice único decide
+        raise HTTPException(status_code=400, detail="Email já cadastrado")
+    await bump_stats(users=1)
     return {"message": "Usuário criado", "user": UserResponse(id=user_id, email=user_data.email, credits=0, created_at=new_user["created_at"])}
 
 @app.post("/api/auth/login")
 async def login_user(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user or not await password_hasher.verify(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Email ou senha incorretos")
+    if password_hasher.needs_rehash(user["password"]):
+        password_hasher.schedule_rehash(user["_id"], credentials.password)
     return {"token": create_jwt_token(user), "user": UserResponse(id=user["_id"], email=user["email"], credits=user.get("credits", 0), created_at=user["created_at"])}
 
-@app.post("/api/search")
-async def search_person(search_data: SearchRequest, current_user: dict = Depends(get_current_user)):
-    if current_user.get("credits", 0) < 1:
-        raise HTTPException(status_code=400, detail="Créditos insuficientes")
+def cacheable(results: Dict[str, Any]) -> bool:
+    """Resultado cortado pelo prazo ou sem resposta de nenhum motor não vai para o cache: a próxima busca
+    completa o que faltou (o que chegou já está no cache de SERP)"""
+    completeness = results["completeness"]
+    return not completeness["timed_out"] and completeness["answered"]
+
+async def execute_search(name: Optional[str], cpf: Optional[str], force_refresh: bool = False, on_batch: Optional[Callable] = None) -> Dict[str, Any]:
+    """Executa a busca passando pelo cache de resultados; devolve os resultados com o bloco 'cache'"""
+    cache_key = search_cache_key(name, cpf)
+    hot_refresher.touch()
+    cached = None if force_refresh else await search_cache.get(cache_key)
+    SEARCH_CACHE_EVENTS.labels("bypass" if force_refresh else "hit" if cached else "miss").inc()
+    if cached:
+        stored_at, results = cached
+        cache_info = {"hit": True, "age_seconds": int(time.time() - stored_at), "cached_at": datetime.fromtimestamp(stored_at, timezone.utc).isoformat()}
+    else:
+        results = await search_system.search_person(name=name, cpf=cpf, on_batch=on_batch)
+        if cacheable(results):
+            await search_cache.set(cache_key, results)
+        cache_info = {"hit": False, "age_seconds": 0, "cached_at": results["timestamp"]}
+    return {**results, "cache": cache_info}
+
+# ARMAZENAMENTO COMPACTO: entradas de SERP ficam uma única vez em serp_entries
+# e os registros das seções de db.searches apenas as referenciam.
+# Seções na ordem de maior truncamento (título, snippet) para o menor, de modo
+# que a primeira entrada criada para uma URL sirva às seções seguintes.
+SERP_ENTRY_TEMPLATES = {
+    "legal_records": {"keys": ["type", "title", "description", "source", "url"], "title": ("title", 250), "snippet": ("description", 400), "engine": "source", "fixed": {"type": "Processo Judicial"}},
+    "public_records": {"keys": ["source", "title", "snippet", "url", "engine"], "title": ("title", 200), "snippet": ("snippet", 350), "engine": "engine", "fixed": {}},
+    "professional": {"keys": ["type", "company", "details", "source", "url"], "title": ("company", 200), "snippet": ("details", 300), "engine": "source", "fixed": {"type": "💼 Vínculo Empresarial"}},
+}
+RESULTS_FORMAT_COMPACT = 2
+
+def serp_entry_id(url: str, title: str, snippet: str) -> str:
+    """Endereço pelo hash da URL + hash do conteúdo (a mesma URL pode vir com textos diferentes)"""
+    url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()[:24]
+    content_hash = hashlib.sha256(f"{title}\0{snippet}".encode('utf-8')).hexdigest()[:16]
+    return f"{url_hash}.{content_hash}"
+
+def _template_matches(template: dict, record: Any) -> bool:
+    return (isinstance(record, dict) and list(record) == template["keys"]
+            and all(record[k] == v for k, v in template["fixed"].items())
+            and all(isinstance(record[k], str) for k in (template["title"][0], template["snippet"][0], "url")))
+
+def compact_search_results(results: Dict[str, Any]) -> tuple:
+    """Troca registros derivados de SERP por referências; devolve (results compacto, entradas novas por _id)"""
+    entries: Dict[str, Dict[str, str]] = {}
+    by_url: Dict[str, List[str]] = {}
+    compact = dict(results)
+    for section, template in SERP_ENTRY_TEMPLATES.items():
+        if not isinstance(results.get(section), list):
+            continue
+        (title_key, title_len), (snippet_key, snippet_len) = template["title"], template["snippet"]
+        extras = [k for k in template["keys"] if k not in (title_key, snippet_key, template["engine"], "url") and k not in template["fixed"]]
+        items = []
+        for record in results[section]:
+            if not _template_matches(template, record):
+                items.append(record)
+                continue
+            url, title, snippet = record["url"], record[title_key], record[snippet_key]
+            entry_id = next((eid for eid in by_url.get(url, [])
+                             if entries[eid]["title"][:title_len] == title and entries[eid]["snippet"][:snippet_len] == snippet), None)
+            if entry_id is None:
+                entry_id = serp_entry_id(url, title, snippet)
+                entries[entry_id] = {"url": url, "title": title, "snippet": snippet}
+                by_url.setdefault(url, []).append(entry_id)
+            items.append({"_e": entry_id, "_g": record[template["engine"]], **{k: record[k] for k in extras}})
+        compact[section] = items
+    return compact, entries
+
+def expand_search_results(compact: Dict[str, Any], entries: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+    """Reconstrói o formato original de search_person a partir das referências"""
+    results = dict(compact)
+    for section, template in SERP_ENTRY_TEMPLATES.items():
+        if not isinstance(compact.get(section), list):
+            continue
+        (title_key, title_len), (snippet_key, snippet_len) = template["title"], template["snippet"]
+        records = []
+        for item in compact[section]:
+            if not isinstance(item, dict) or "_e" not in item:
+                records.append(item)
+                continue
+            entry = entries[item["_e"]]
+            values = {title_key: entry["title"][:title_len], snippet_key: entry["snippet"][:snippet_len], template["engine"]: item["_g"], "url": entry["url"], **template["fixed"]}
+            records.append({k: values[k] if k in values else item[k] for k in template["keys"]})
+        results[section] = records
+    return results
+
+async def store_serp_entries(entries: Dict[str, Dict[str, str]]):
+    if not entries:
+        return
+    now = datetime.now(timezone.utc)
+    operations = [UpdateOne({"_id": entry_id}, {"$setOnInsert": {
+        "url": entry["url"],
+        "title": entry["title"],
+        "snippet_z": zlib.compress(entry["snippet"].encode('utf-8'), 9),
+        "created_at": now
+    }}, upsert=True) for entry_id, entry in entries.items()]
+    try:
+        await db.serp_entries.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Upserts concorrentes do mesmo _id: a entrada já existe com o mesmo conteúdo
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+async def load_serp_entries(entry_ids) -> Dict[str, Dict[str, str]]:
+    entries = {}
+    async for doc in db.serp_entries.find({"_id": {"$in": list(entry_ids)}}):
+        entries[doc["_id"]] = {"url": doc["url"], "title": doc["title"], "snippet": zlib.decompress(doc["snippet_z"]).decode('utf-8')}
+    return entries
+
+async def expand_search_documents(docs: List[dict]) -> List[dict]:
+    """Expande in-place os results compactos de vários documentos de db.searches com uma única leitura"""
+    compact_docs = [d for d in docs if d.get("results_format") == RESULTS_FORMAT_COMPACT and isinstance(d.get("results"), dict)]
+    entry_ids = {item["_e"] for d in compact_docs for section in SERP_ENTRY_TEMPLATES
+                 for item in d["results"].get(section) or [] if isinstance(item, dict) and "_e" in item}
+    entries = await load_serp_entries(entry_ids) if entry_ids else {}
+    for doc in compact_docs:
+        doc["results"] = expand_search_results(doc["results"], entries)
+        doc.pop("results_format", None)
+    return docs
+
+async def record_search(user_email: str, name: Optional[str], cpf: Optional[str], results: Dict[str, Any], search_id: Optional[str] = None):
+    compact, entries = compact_search_results(results)
+    await store_serp_entries(entries)
+    try:
+        await db.searches.insert_one({
+            "_id": search_id or str(uuid.uuid4()), 
+            "user_email": user_email, 
+            "search_name": name or cpf, 
+            "query": {"name": name, "cpf": cpf},
+            "cache_key": search_cache_key(name, cpf),
+            "results": compact, 
+            "results_format": RESULTS_FORMAT_COMPACT,
+            "created_at": datetime.now(timezone.utc)
+        })
+    except DuplicateKeyError:
+        # Retentativa de um job que caiu depois de gravar a busca: já registrada e contabilizada
+        log.info("busca já registrada", extra={"search_id": search_id})
+        return
+    await bump_stats(searches=1)
+
+class SearchJobQueue:
+    """Fila de buscas persistida em search_jobs, processada por um pool de workers em background"""
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.busy = 0
+        self.worker_id = WORKER_ID
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+    
+    async def start(self):
+        await self.requeue_stale()
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper_loop()))
+        log.info("workers de busca iniciados", extra={"workers": self.workers, "worker_id": self.worker_id})
+    
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    @staticmethod
+    def job_document(job_id: str, user: dict, name: Optional[str], cpf: Optional[str], force_refresh: bool, priority: int = 0, **extra) -> dict:
+        return {
+            "_id": job_id,
+            "user_id": user["_id"],
+            "user_email": user["email"],
+            "name": name,
+            "cpf": cpf,
+            "force_refresh": force_refresh,
+            "status": "queued",
+            "priority": priority,
+            "attempts": 0,
+            "created_at": datetime.now(timezone.utc),
+            **extra
+        }
+    
+    async def enqueue(self, job_id: str, user: dict, search_data: SearchRequest) -> str:
+        await db.search_jobs.insert_one(self.job_document(job_id, user, search_data.name, search_data.cpf, search_data.force_refresh))
+        self._wakeup.set()
+        return job_id
+    
+    async def enqueue_batch(self, batch_id: str, user: dict, entries: List[tuple], force_refresh: bool) -> List[str]:
+        """Um job por entrada única; prioridade 1 para que lotes grandes não atrasem buscas avulsas"""
+        jobs = [self.job_document(str(uuid.uuid4()), user, name, cpf, force_refresh, priority=1, batch_id=batch_id, position=position, reservation=batch_id)
+                for position, (name, cpf) in enumerate(entries)]
+        if jobs:
+            await db.search_jobs.insert_many(jobs)
+        self._wakeup.set()
+        return [job["_id"] for job in jobs]
+    
+    async def claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await db.search_jobs.find_one_and_update(
+            {"status": "queued"},
+            {"$set": {"status": "running", "worker_id": self.worker_id, "started_at": now, "heartbeat_at": now}, "$inc": {"attempts": 1}},
+            sort=[("priority", 1), ("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def _worker_loop(self):
+        while True:
+            # Limpa antes de consultar: um enqueue concorrente sempre acorda o worker
+            self._wakeup.clear()
+            try:
+                job = await self.claim()
+            except Exception as e:
+                log.error("erro ao buscar job", extra={"error": str(e)[:100]})
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), SEARCH_JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.busy += 1
+            try:
+                await self.process(job)
+            finally:
+                self.busy -= 1
+    
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(SEARCH_JOB_HEARTBEAT)
+            try:
+                await db.search_jobs.update_one({"_id": job_id, "status": "running"}, {"$set": {"heartbeat_at": datetime.now(timezone.utc)}})
+            except PyMongoError as e:
+                # Uma falha isolada não pode matar o heartbeat: sem ele o job seria reenfileirado no meio da busca
+                log.warning("falha no heartbeat do job", extra={"job_id": job_id, "error": str(e)[:100]})
+    
+    async def process(self, job: dict):
+        heartbeat = asyncio.create_task(self._heartbeat(job["_id"]))
+        try:
+            results = await execute_search(job["name"], job["cpf"], job.get("force_refresh", False))
+            await record_search(job["user_email"], job["name"], job["cpf"], results, search_id=job["_id"])
+            await db.search_jobs.update_one({"_id": job["_id"]}, {"$set": {"status": "done", "results": results, "finished_at": datetime.now(timezone.utc)}})
+        except asyncio.CancelledError:
+            # Shutdown: devolve o job à fila para ser retomado no próximo start
+            await asyncio.shield(db.search_jobs.update_one({"_id": job["_id"], "status": "running"}, {"$set": {"status": "queued"}, "$inc": {"attempts": -1}}))
+            raise
+        except Exception as e:
+            log.warning("job falhou", extra={"job_id": job["_id"], "error": str(e)[:100]})
+            await self.fail(job, str(e)[:300])
+        finally:
+            heartbeat.cancel()
+    
+    async def fail(self, job: dict, error: str):
+        """Marca o job como falho e devolve o crédito reservado (uma única vez)"""
+        result = await db.search_jobs.update_one(
+            {"_id": job["_id"], "status": {"$in": ["queued", "running"]}},
+            {"$set": {"status": "failed", "error": error, "finished_at": datetime.now(timezone.utc)}}
+        )
+        if not result.modified_count:
+            return
+        # Jobs de lote devolvem sua parte da reserva do lote; jobs avulsos, a própria reserva
+        reservation = job.get("reservation") or job.get("batch_id")
+        if reservation:
+            await refund_credit(job["user_id"], reservation, part=job["_id"])
+        else:
+            await refund_credit(job["user_id"], job["_id"])
+    
+    async def requeue_stale(self):
+        """Retoma jobs cujo worker parou de enviar heartbeat (restart, deploy, crash)"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=SEARCH_JOB_HEARTBEAT * 4)
+        stale = {"status": "running", "heartbeat_at": {"$lt": cutoff}}
+        async for job in db.search_jobs.find({**stale, "attempts": {"$gte": SEARCH_JOB_MAX_ATTEMPTS}}):
+            await self.fail(job, "Número máximo de tentativas excedido")
+        result = await db.search_jobs.update_many(stale, {"$set": {"status": "queued"}})
+        if result.modified_count:
+            log.info("jobs retomados", extra={"jobs": result.modified_count})
+            self._wakeup.set()
+    
+    async def _reaper_loop(self):
+        while True:
+            await asyncio.sleep(SEARCH_JOB_HEARTBEAT)
+            try:
+                await self.requeue_stale()
+            except Exception as e:
+                log.error("erro ao retomar jobs", extra={"error": str(e)[:100]})
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        counts = {doc["_id"]: doc["count"] async for doc in db.search_jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])}
+        return {
+            "queue_depth": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "jobs_by_status": counts,
+            "workers": self.workers,
+            "busy_workers": self.busy,
+            "utilization": self.busy / self.workers if self.workers else 0
+        }
+
+search_jobs = SearchJobQueue(SEARCH_WORKERS)
+
+class HotSearchRefresher:
+    """Mantém no cache de resultados, renovadas fora do pico, as buscas mais repetidas do histórico.
+    
+    A cada HOT_REFRESH_INTERVAL, se não houver busca de usuário há HOT_REFRESH_IDLE_SECONDS nem job em
+    execução (neste processo nem em db.searches/db.search_jobs, para valer entre workers), um único processo (lease em settings) agrega db.searches da janela recente e refaz
+    search_person para os termos com pelo menos HOT_REFRESH_MIN_SEARCHES buscas cuja entrada no cache
+    passou de HOT_REFRESH_STALE_FRACTION do TTL. O ciclo para no primeiro sinal de tráfego ou quando as
+    requisições upstream da última hora (query_plan de cada busca) esgotam o orçamento.
+    """
+    def __init__(self, top: int, min_searches: int, window_days: int, interval: float, idle_seconds: float,
+                 budget_per_hour: int, stale_fraction: float):
+        self.top = top
+        self.min_searches = min_searches
+        self.window_days = window_days
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.budget_per_hour = budget_per_hour
+        self.stale_fraction = stale_fraction
+        self.worker_id = WORKER_ID
+        self.last_activity = time.monotonic()
+        self.spent: deque = deque()
+        self.stats = {"cycles": 0, "refreshed": 0, "fresh": 0, "partial": 0, "failed": 0, "interrupted": 0, "last_cycle_at": None}
+        self._task: Optional[asyncio.Task] = None
+    
+    def touch(self):
+        """Chamado a cada busca de usuário: adia a renovação e interrompe um ciclo em andamento"""
+        self.last_activity = time.monotonic()
+    
+    async def idle(self) -> bool:
+        if time.monotonic() - self.last_activity < self.idle_seconds or search_jobs.busy:
+            return False
+        since = datetime.now(timezone.utc) - timedelta(seconds=self.idle_seconds)
+        if await db.searches.find_one({"created_at": {"$gte": since}}, {"_id": 1}):
+            return False
+        return await db.search_jobs.find_one({"status": "running"}, {"_id": 1}) is None
+    
+    def budget_left(self) -> int:
+        cutoff = time.monotonic() - 3600
+        while self.spent and self.spent[0][0] < cutoff:
+            self.spent.popleft()
+        return self.budget_per_hour - sum(requests for _, requests in self.spent)
+    
+    async def start(self):
+        if self.top > 0:
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
     
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not await self.idle():
+                continue
+            try:
+                if await self._take_lease():
+                    await self.run_cycle()
+            except Exception as e:
+                log.error("erro na renovação de buscas", extra={"error": str(e)[:100]})
+    
+    async def _take_lease(self) -> bool:
+        return await take_lease("hot_refresh", self.worker_id, self.interval)
+    
+    async def hot_terms(self) -> List[Dict[str, Any]]:
+        """Termos mais buscados na janela, agrupados pela chave do cache (nome normalizado ou CPF)"""
+        since = datetime.now(timezone.utc) - timedelta(days=self.window_days)
+        pipeline = [
+            {"$match": {"created_at": {"$gte": since}}},
+            # Buscas gravadas antes de cache_key só têm search_name (nome ou CPF)
+            {"$group": {"_id": {"$ifNull": ["$cache_key", "$search_name"]}, "query": {"$first": "$query"},
+                        "search_name": {"$first": "$search_name"}, "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            # Registros antigos com grafias diferentes do mesmo nome só se juntam depois; pega uma margem além do top
+            {"$limit": self.top * 5},
+        ]
+        terms: Dict[str, Dict[str, Any]] = {}
+        async for doc in db.searches.aggregate(pipeline):
+            query = doc.get("query") or {"name": doc["search_name"], "cpf": None}
+            try:
+                name, cpf = normalize_batch_entry(query["name"], query["cpf"])
+            except (ValueError, TypeError):
+                continue
+            key = search_cache_key(name, cpf)
+            terms.setdefault(key, {"key": key, "name": name, "cpf": cpf, "searches": 0})["searches"] += doc["count"]
+        hot = [term for term in terms.values() if term["searches"] >= self.min_searches]
+        return sorted(hot, key=lambda term: term["searches"], reverse=True)[:self.top]
+    
+    async def run_cycle(self) -> Dict[str, int]:
+        outcome = {"refreshed": 0, "fresh": 0, "partial": 0, "failed": 0, "interrupted": 0}
+        search_cost = SEARCH_REQUEST_BUDGET or len(QUERY_TEMPLATES) * len(MultiSearchEngine.ENGINES)
+        stale_after = search_cache.ttl * self.stale_fraction
+        for term in await self.hot_terms():
+            if self.budget_left() < search_cost or not await self.idle():
+                outcome["interrupted"] = 1
+                break
+            cached = await search_cache.get(term["key"])
+            if cached and time.time() - cached[0] < stale_after:
+                outcome["fresh"] += 1
+                continue
+            try:
+                with span("hot_refresh"):
+                    results = await search_system.search_person(name=term["name"], cpf=term["cpf"])
+            except Exception as e:
+                log.warning("falha ao renovar busca", extra={"key": term["key"], "error": str(e)[:100]})
+                outcome["failed"] += 1
+                continue
+            self.spent.append((time.monotonic(), results["query_plan"]["requests"]))
+            if not cacheable(results):
+                outcome["partial"] += 1
+                continue
+            await search_cache.set(term["key"], results)
+            outcome["refreshed"] += 1
+        for name, count in outcome.items():
+            HOT_REFRESHES.labels(name).inc(count)
+            self.stats[name] += count
+        self.stats["cycles"] += 1
+        self.stats["last_cycle_at"] = datetime.now(timezone.utc)
+        log.info("renovação de buscas concluída", extra={**outcome, "budget_left": self.budget_left()})
+        return outcome
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.top > 0,
+            "idle": await self.idle(),
+            "budget_per_hour": self.budget_per_hour,
+            "budget_left": self.budget_left()
+        }
+
+hot_refresher = HotSearchRefresher(HOT_REFRESH_TOP, HOT_REFRESH_MIN_SEARCHES, HOT_REFRESH_WINDOW_DAYS, HOT_REFRESH_INTERVAL,
+                                   HOT_REFRESH_IDLE_SECONDS, HOT_REFRESH_BUDGET_PER_HOUR, HOT_REFRESH_STALE_FRACTION)
+
+# Chaves de primeiro nível da resposta de busca que podem ser pedidas em ?fields=
+SEARCH_RESULT_FIELDS = ("name", "cpf", "timestamp", "sources_searched", "profiles_found", "social_media", "legal_records",
+                        "professional", "family_info", "public_records", "risk_assessment", "query_plan", "completeness", "disclaimer", "cache")
+
+def parse_fields(fields: Optional[str]) -> Optional[frozenset]:
+    """?fields=legal_records,professional -> conjunto validado; None = resposta completa"""
+    if not fields:
+        return None
+    selected = frozenset(f.strip() for f in fields.split(",") if f.strip())
+    unknown = selected.difference(SEARCH_RESULT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(sorted(unknown))}. Disponíveis: {', '.join(SEARCH_RESULT_FIELDS)}")
+    return selected
+
+def select_fields(results: Optional[Dict[str, Any]], selected: Optional[frozenset]) -> Optional[Dict[str, Any]]:
+    if results is None or selected is None:
+        return results
+    return {k: v for k, v in results.items() if k in selected}
+
+class CsvLines:
+    """Formata uma linha CSV por vez, para respostas em streaming"""
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+    
+    def __call__(self, values: list) -> str:
+        self.writer.writerow(values)
+        line = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return line
+
+def csv_value(value: Any) -> Any:
+    return json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list)) else value
+
+@app.post("/api/search")
+async def search_person(search_data: SearchRequest, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     # Aceitar nome OU cpf
-    results = await search_system.search_person(name=search_data.name, cpf=search_data.cpf)
+    if not search_data.name and not search_data.cpf:
+        raise HTTPException(status_code=400, detail="Informe nome ou CPF")
+    selected = parse_fields(fields)
     
-    await db.users.update_one({"_id": current_user["_id"]}, {"$inc": {"credits": -1}})
-    await db.searches.insert_one({
-        "_id": str(uuid.uuid4()), 
-        "user_email": current_user["email"], 
-        "search_name": search_data.name or search_data.cpf, 
-        "results": results, 
-        "created_at": datetime.now(timezone.utc)
+    # O crédito é reservado antes de qualquer scraping e devolvido se a busca falhar
+    search_id = str(uuid.uuid4())
+    await reserve_credit(current_user["_id"], search_id)
+    
+    if search_data.async_job:
+        try:
+            await search_jobs.enqueue(search_id, current_user, search_data)
+        except BaseException:
+            await asyncio.shield(db.search_jobs.delete_one({"_id": search_id, "status": "queued"}))
+            await asyncio.shield(refund_credit(current_user["_id"], search_id))
+            raise
+        return JSONResponse(status_code=202, content={"job_id": search_id, "status": "queued"})
+    
+    try:
+        results = await execute_search(search_data.name, search_data.cpf, search_data.force_refresh)
+        # Sem o registro a busca não é entregue: falha aqui também devolve o crédito
+        await record_search(current_user["email"], search_data.name, search_data.cpf, results, search_id=search_id)
+    except BaseException:
+        await asyncio.shield(refund_credit(current_user["_id"], search_id))
+        raise
+    
+    # Resposta direta pelo orjson, sem passar pelo jsonable_encoder do FastAPI
+    return FastJSONResponse(select_fields(results, selected))
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data, default=str).decode('utf-8')}\n\n"
+
+@app.post("/api/search/stream")
+async def search_person_stream(search_data: SearchRequest, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Mesma busca de /api/search, transmitida via Server-Sent Events:
+    'batch' a cada motor/query concluído, 'analysis' com as seções que mudaram e 'result' com a resposta final"""
+    if not search_data.name and not search_data.cpf:
+        raise HTTPException(status_code=400, detail="Informe nome ou CPF")
+    selected = parse_fields(fields)
+    
+    search_id = str(uuid.uuid4())
+    await reserve_credit(current_user["_id"], search_id)
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def run_search():
+        try:
+            results = await execute_search(search_data.name, search_data.cpf, search_data.force_refresh,
+                                           on_batch=lambda query, engine, batch: queue.put_nowait(("batch", {"query": query, "engine": engine, "results": batch})))
+            # Gravar a busca faz parte da cobrança: cancelado aqui, o crédito também volta
+            await record_search(current_user["email"], search_data.name, search_data.cpf, results, search_id=search_id)
+        except asyncio.CancelledError:
+            await asyncio.shield(refund_credit(current_user["_id"], search_id))
+            raise
+        except Exception as e:
+            await refund_credit(current_user["_id"], search_id)
+            queue.put_nowait(("error", {"detail": str(e)[:300]}))
+            return
+        queue.put_nowait(("result", select_fields(results, selected)))
+    
+    task = asyncio.create_task(run_search())
+    
+    async def events():
+        merger = SerpResultMerger()
+        sections: Dict[str, Any] = {}
+        try:
+            while True:
+                event, data = await queue.get()
+                yield sse_event(event, data)
+                if event != "batch":
+                    break
+                if not data["results"]:
+                    continue
+                # Prévia da análise sobre o que já chegou (ordem de chegada, não a ordem final)
+                merger.add(data["query"], data["results"])
+                changed = {k: v for k, v in analysis_pipeline.run(merger.results, record_metrics=False).items() if sections.get(k) != v}
+                if changed:
+                    sections.update(changed)
+                    yield sse_event("analysis", {**changed, "total_results": len(merger.results)})
+        finally:
+            # Cliente desconectou antes do fim: a busca é abandonada e o crédito devolvido
+            if not task.done():
+                task.cancel()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/search/{job_id}")
+async def get_search_job(job_id: str, fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    selected = parse_fields(fields)
+    job = await db.search_jobs.find_one({"_id": job_id, "user_id": current_user["_id"]})
+    if not job:
+        raise HTTPException(status_code=404, detail="Busca não encontrada")
+    return FastJSONResponse({
+        "job_id": job["_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "results": select_fields(job.get("results"), selected),
+        "error": job.get("error")
     })
+
+# LOTES: entradas normalizadas e deduplicadas pela mesma chave do cache de resultados
+CPF_PATTERN = re.compile(r'\d{3}\.?\d{3}\.?\d{3}-?\d{2}')
+# Prefixos dos títulos de coluna reconhecidos no cabeçalho (comparados sem acento e sem caixa)
+BATCH_NAME_COLUMNS = ("nome", "name", "cliente", "titular")
+BATCH_CPF_COLUMNS = ("cpf", "documento")
+
+def normalize_batch_entry(name: Optional[str], cpf: Optional[str]) -> tuple:
+    """(nome, cpf) limpos; um valor com formato de CPF na coluna de nome vira CPF. ValueError se a entrada for inválida"""
+    name = ' '.join((name or '').split()) or None
+    cpf = (cpf or '').strip() or None
+    if name and not cpf and CPF_PATTERN.fullmatch(name.replace(' ', '')):
+        name, cpf = None, name
+    if cpf and len(re.sub(r'\D', '', cpf)) != 11:
+        raise ValueError("CPF inválido")
+    if name and sum(c.isalpha() for c in name) < 2:
+        raise ValueError("Nome inválido")
+    if not name and not cpf:
+        raise ValueError("Informe nome ou CPF")
+    return name, cpf
+
+def _header_column(header: List[str], prefixes: tuple) -> Optional[int]:
+    """Coluna cujo título começa por um dos prefixos ("Nome Completo", "CPF/CNPJ", "Documento do cliente")"""
+    for index, cell in enumerate(header):
+        folded = ''.join(c for c in unicodedata.normalize('NFKD', cell) if not unicodedata.combining(c)).casefold().strip(' "\'#*')
+        if folded.startswith(prefixes):
+            return index
+    return None
+
+def parse_batch_csv(text: str) -> List[tuple]:
+    """Linhas do CSV como (linha original, nome, cpf). Com cabeçalho usa as colunas nome/cpf;
+    sem cabeçalho, a primeira célula preenchida de cada linha. Uma primeira linha com cara de
+    cabeçalho (segundo o csv.Sniffer) nunca vira entrada cobrada"""
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    rows = [[cell.strip() for cell in row] for row in csv.reader(io.StringIO(text), dialect) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    name_col = _header_column(rows[0], BATCH_NAME_COLUMNS)
+    cpf_col = _header_column(rows[0], BATCH_CPF_COLUMNS)
+    if name_col is None and cpf_col is None:
+        try:
+            has_header = len(rows) > 1 and csv.Sniffer().has_header(text[:4096])
+        except csv.Error:
+            has_header = False
+        return [(value, value, None) for value in (next(cell for cell in row if cell) for row in rows[1 if has_header else 0:])]
     
-    return results
+    def cell(row: List[str], col: Optional[int]) -> Optional[str]:
+        return row[col] if col is not None and col < len(row) else None
+    return [(dialect.delimiter.join(row), cell(row, name_col), cell(row, cpf_col)) for row in rows[1:]]
+
+async def read_batch_entries(request: Request) -> tuple:
+    """(entradas, force_refresh) de um upload multipart (campo 'file'), de um corpo text/csv ou de JSON {"entries": [...]}"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        try:
+            body = BatchSearchRequest.model_validate_json(await request.body())
+        except ValidationError:
+            raise HTTPException(status_code=400, detail='JSON inválido: esperado {"entries": ["nome ou CPF", {"name": ..., "cpf": ...}]}')
+        entries = [(e, e, None) if isinstance(e, str) else (e.cpf or e.name or "", e.name, e.cpf) for e in body.entries]
+        return entries, body.force_refresh
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Envie o CSV no campo 'file'")
+        raw = await upload.read(BATCH_MAX_UPLOAD_BYTES + 1)
+    else:
+        raw = await request.body()
+    if len(raw) > BATCH_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Arquivo maior que {BATCH_MAX_UPLOAD_BYTES} bytes")
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Planilhas exportadas pelo Excel em português costumam vir em Latin-1
+        text = raw.decode("latin-1")
+    return parse_batch_csv(text), False
+
+@app.post("/api/search/batch")
+async def create_search_batch(request: Request, force_refresh: bool = False, current_user: dict = Depends(get_current_user)):
+    """Lote de buscas a partir de um CSV ou de uma lista JSON. Entradas repetidas (mesma chave do cache)
+    são buscadas e cobradas uma única vez; cada entrada única vira um job da fila search_jobs"""
+    entries, body_refresh = await read_batch_entries(request)
+    if not entries:
+        raise HTTPException(status_code=400, detail="Nenhuma entrada no lote")
+    if len(entries) > BATCH_MAX_ENTRIES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {BATCH_MAX_ENTRIES} entradas por lote")
+    
+    rows: List[dict] = []
+    unique: List[tuple] = []
+    positions: Dict[str, int] = {}
+    for raw, name, cpf in entries:
+        try:
+            name, cpf = normalize_batch_entry(name, cpf)
+        except ValueError as e:
+            rows.append({"input": raw, "error": str(e)})
+            continue
+        key = search_cache_key(name, cpf)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append((name, cpf))
+        rows.append({"input": raw, "name": name, "cpf": cpf, "position": positions[key]})
+    if not unique:
+        raise HTTPException(status_code=400, detail="Nenhuma entrada válida no lote")
+    
+    batch_id = str(uuid.uuid4())
+    invalid = sum(1 for row in rows if "error" in row)
+    await reserve_credit(current_user["_id"], batch_id, len(unique))
+    try:
+        await db.search_batches.insert_one({
+            "_id": batch_id,
+            "user_id": current_user["_id"],
+            "user_email": current_user["email"],
+            "entries": len(rows),
+            "unique": len(unique),
+            "invalid": invalid,
+            "rows": rows,
+            "created_at": datetime.now(timezone.utc)
+        })
+        await search_jobs.enqueue_batch(batch_id, current_user, unique, force_refresh or body_refresh)
+    except BaseException:
+        await asyncio.shield(db.search_jobs.delete_many({"batch_id": batch_id, "status": "queued"}))
+        await asyncio.shield(refund_credit(current_user["_id"], batch_id, len(unique)))
+        raise
+    log.info("lote enfileirado", extra={"batch_id": batch_id, "entries": len(rows), "unique": len(unique), "invalid": invalid})
+    
+    return JSONResponse(status_code=202, content={
+        "batch_id": batch_id,
+        "status": "queued",
+        "entries": len(rows),
+        "unique": len(unique),
+        "duplicates": len(rows) - invalid - len(unique),
+        "invalid": invalid,
+        "credits_charged": len(unique),
+        "progress_url": f"/api/search/batch/{batch_id}",
+        "results_url": f"/api/search/batch/{batch_id}/results"
+    })
+
+@app.get("/api/search/batch/{batch_id}")
+async def get_search_batch(batch_id: str, current_user: dict = Depends(get_current_user)):
+    batch = await db.search_batches.find_one({"_id": batch_id, "user_id": current_user["_id"]}, {"rows": 0})
+    if not batch:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    pipeline = [{"$match": {"batch_id": batch_id}}, {"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    counts = {doc["_id"]: doc["count"] async for doc in db.search_jobs.aggregate(pipeline)}
+    completed = counts.get("done", 0) + counts.get("failed", 0)
+    return FastJSONResponse({
+        "batch_id": batch_id,
+        "status": "done" if completed >= batch["unique"] else "running" if completed or counts.get("running") else "queued",
+        "entries": batch["entries"],
+        "unique": batch["unique"],
+        "invalid": batch["invalid"],
+        "jobs": counts,
+        "completed": completed,
+        "progress": round(completed / batch["unique"], 4),
+        "created_at": batch["created_at"]
+    })
+
+@app.get("/api/search/batch/{batch_id}/results")
+async def get_search_batch_results(batch_id: str, format: str = "ndjson", fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Uma linha por entrada enviada, na ordem original (repetidas trazem o resultado da entrada única).
+    Pode ser baixado com o lote em andamento: jobs pendentes saem com status queued/running e sem resultados"""
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Formato deve ser ndjson ou csv")
+    selected = parse_fields(fields)
+    batch = await db.search_batches.find_one({"_id": batch_id, "user_id": current_user["_id"]})
+    if not batch:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    result_columns = [f for f in SEARCH_RESULT_FIELDS if f not in ("name", "cpf") and (selected is None or f in selected)]
+    csv_line = CsvLines()
+    
+    def line(row: dict, job: Optional[dict]) -> str:
+        status = "invalid" if "error" in row else job["status"] if job else "expired"
+        results = select_fields(job.get("results"), selected) if job else None
+        error = row.get("error") or (job or {}).get("error")
+        if format == "ndjson":
+            record = {"input": row["input"], "name": row.get("name"), "cpf": row.get("cpf"), "status": status, "error": error, "results": results}
+            return orjson.dumps(record, default=str).decode('utf-8') + "\n"
+        return csv_line([row["input"], row.get("name"), row.get("cpf"), status, error, *(csv_value((results or {}).get(f, "")) for f in result_columns)])
+    
+    async def lines():
+        if format == "csv":
+            yield csv_line(["input", "name", "cpf", "status", "error", *result_columns])
+        # Blocos de 100 entradas: uma consulta por bloco e memória limitada ao bloco
+        for start in range(0, len(batch["rows"]), 100):
+            chunk = batch["rows"][start:start + 100]
+            positions = sorted({row["position"] for row in chunk if "position" in row})
+            jobs = {job["position"]: job async for job in db.search_jobs.find(
+                {"batch_id": batch_id, "position": {"$in": positions}}, {"position": 1, "status": 1, "results": 1, "error": 1})}
+            for row in chunk:
+                yield line(row, jobs.get(row.get("position")))
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    headers = {"Content-Disposition": f'attachment; filename="lote-{batch_id}.{format}"'}
+    return StreamingResponse(lines(), media_type=media_type, headers=headers)
 
 @app.post("/api/purchase")
 async def create_purchase(purchase_data: PurchaseRequest, current_user: dict = Depends(get_current_user)):
@@ -568,41 +2799,274 @@ async def create_purchase(purchase_data: PurchaseRequest, current_user: dict = D
         "status": "pending", 
         "created_at": datetime.now(timezone.utc)
     })
+    await bump_stats(purchases=1)
     return {"transaction_id": transaction_id, "pix_info": {"key": PIX_KEY, "name": PIX_NAME, "amount": purchase_data.amount}}
 
 @app.get("/api/admin/stats")
 async def get_admin_stats():
-    total_users = await db.users.count_documents({})
-    total_searches = await db.searches.count_documents({})
-    confirmed = await db.transactions.find({"status": "confirmed"}).to_list(None)
-    return {"total_users": total_users, "total_searches": total_searches, "total_revenue": sum(t["amount"] for t in confirmed), "today_sales": 0}
+    docs = {doc["_id"]: doc async for doc in db.stats.find({"_id": {"$in": ["totals", f"daily:{today_key()}"]}})}
+    totals = docs.get("totals", {})
+    today = docs.get(f"daily:{today_key()}", {})
+    return {
+        "total_users": totals.get("users", 0),
+        "total_searches": totals.get("searches", 0),
+        "total_revenue": totals.get("revenue", 0),
+        "today_sales": today.get("sales", 0),
+        "today": {field: today.get(field, 0) for field in STAT_FIELDS}
+    }
+
+@app.get("/api/admin/stats/daily")
+async def get_admin_daily_stats(days: int = 30):
+    days = max(1, min(days, 366))
+    first_day = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    rollups = await db.stats.find({"_id": {"$gte": f"daily:{first_day}", "$lt": "daily;"}}).sort("_id", 1).to_list(days)
+    return {"days": [{"date": d["date"], **{field: d.get(field, 0) for field in STAT_FIELDS}} for d in rollups]}
+
+@app.post("/api/admin/stats/rebuild")
+async def rebuild_admin_stats():
+    totals = await rebuild_stats()
+    return {"success": True, "totals": {field: totals[field] for field in STAT_FIELDS}}
+
+@app.post("/api/admin/transactions/{transaction_id}/confirm")
+async def confirm_transaction(transaction_id: str):
+    """Confirma o pagamento: libera os créditos e contabiliza a venda (uma única vez por transação)"""
+    transaction = await db.transactions.find_one_and_update(
+        {"_id": transaction_id, "status": "pending"},
+        {"$set": {"status": "confirmed", "confirmed_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transação pendente não encontrada")
+    user = await update_user({"email": transaction["user_email"]}, {"$inc": {"credits": int(transaction["credits"])}})
+    if user:
+        await db.credit_ledger.insert_one(ledger_entry(user["_id"], int(transaction["credits"]), "purchase", transaction_id))
+    await bump_stats(sales=1, revenue=transaction["amount"])
+    return {"success": True, "message": f"{transaction['credits']} créditos liberados"}
 
 @app.get("/api/user/profile")
 async def get_user_profile(current_user: dict = Depends(get_current_user)):
     return UserResponse(id=current_user["_id"], email=current_user["email"], credits=current_user.get("credits", 0), created_at=current_user["created_at"])
 
+# Coleções expostas nas listagens admin: campo de email, campo de status, projeção padrão e colunas do CSV
+ADMIN_COLLECTIONS = {
+    "users": {"email_field": "email", "status_field": None, "projection": {"password": 0},
+              "csv_fields": ["_id", "email", "credits", "created_at"]},
+    "transactions": {"email_field": "user_email", "status_field": "status", "projection": None,
+                     "csv_fields": ["_id", "user_email", "package_type", "amount", "credits", "status", "created_at"]},
+    "searches": {"email_field": "user_email", "status_field": None, "projection": {"results": 0, "results_format": 0},
+                 "csv_fields": ["_id", "user_email", "search_name", "created_at"]},
+}
+
+class AdminQuery:
+    """Parâmetros comuns das listagens admin: filtros, página e cursor"""
+    def __init__(self, limit: int = ADMIN_PAGE_SIZE, cursor: Optional[str] = None, date_from: Optional[datetime] = None,
+                 date_to: Optional[datetime] = None, user_email: Optional[str] = None, status: Optional[str] = None,
+                 include_results: bool = False):
+        self.limit = max(1, min(limit, ADMIN_PAGE_MAX))
+        self.cursor = cursor
+        self.date_from = date_from
+        self.date_to = date_to
+        self.user_email = user_email
+        self.status = status
+        self.include_results = include_results
+    
+    def filter(self, collection: str) -> dict:
+        config = ADMIN_COLLECTIONS[collection]
+        query: Dict[str, Any] = {}
+        if self.date_from or self.date_to:
+            query["created_at"] = {}
+            if self.date_from:
+                query["created_at"]["$gte"] = self.date_from
+            if self.date_to:
+                query["created_at"]["$lt"] = self.date_to
+        if self.user_email:
+            query[config["email_field"]] = self.user_email
+        if self.status and config["status_field"]:
+            query[config["status_field"]] = self.status
+        if self.cursor:
+            created_at, last_id = decode_admin_cursor(self.cursor)
+            # Keyset: próximos itens na ordem (created_at desc, _id desc)
+            query = {"$and": [query, {"$or": [{"created_at": {"$lt": created_at}}, {"created_at": created_at, "_id": {"$lt": last_id}}]}]}
+        return query
+    
+    def projection(self, collection: str) -> Optional[dict]:
+        if collection == "searches" and self.include_results:
+            return None
+        return ADMIN_COLLECTIONS[collection]["projection"]
+
+def encode_admin_cursor(doc: dict) -> str:
+    raw = json.dumps({"t": as_utc(doc["created_at"]).isoformat(), "id": doc["_id"]})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_admin_cursor(cursor: str) -> tuple:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(data["t"]), data["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def admin_find(collection: str, params: AdminQuery):
+    return db[collection].find(params.filter(collection), params.projection(collection)).sort([("created_at", -1), ("_id", -1)])
+
+async def admin_page(collection: str, params: AdminQuery) -> Dict[str, Any]:
+    items = await admin_find(collection, params).limit(params.limit).to_list(params.limit)
+    if collection == "searches" and params.include_results:
+        await expand_search_documents(items)
+    next_cursor = encode_admin_cursor(items[-1]) if len(items) == params.limit else None
+    return {collection: items, "count": len(items), "next_cursor": next_cursor}
+
 @app.get("/api/admin/users")
-async def get_all_users():
-    users = await db.users.find({}, {"password": 0}).to_list(None)
-    return {"users": users, "total": len(users)}
+async def get_all_users(params: AdminQuery = Depends()):
+    return FastJSONResponse(await admin_page("users", params))
 
 @app.get("/api/admin/transactions")
-async def get_all_transactions():
-    transactions = await db.transactions.find({}).to_list(None)
-    return {"transactions": transactions, "total": len(transactions)}
+async def get_all_transactions(params: AdminQuery = Depends()):
+    return FastJSONResponse(await admin_page("transactions", params))
 
 @app.get("/api/admin/searches")
-async def get_all_searches():
-    searches = await db.searches.find({}).to_list(None)
-    return {"searches": searches, "total": len(searches)}
+async def get_all_searches(params: AdminQuery = Depends()):
+    return FastJSONResponse(await admin_page("searches", params))
+
+@app.get("/api/admin/export/{collection}")
+async def export_admin_collection(collection: str, format: str = "ndjson", params: AdminQuery = Depends()):
+    """Exporta a coleção inteira (com os mesmos filtros) em NDJSON ou CSV, documento a documento"""
+    if collection not in ADMIN_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Coleção não encontrada")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Formato deve ser ndjson ou csv")
+    fields = ADMIN_COLLECTIONS[collection]["csv_fields"] + (["results"] if params.include_results and collection == "searches" else [])
+    
+    csv_line = CsvLines()
+    
+    def line(doc: dict) -> str:
+        if format == "ndjson":
+            return orjson.dumps(doc, default=str).decode('utf-8') + "\n"
+        return csv_line([csv_value(doc.get(f, "")) for f in fields])
+    
+    async def rows():
+        if format == "csv":
+            yield csv_line(fields)
+        expand = collection == "searches" and params.include_results
+        chunk: List[dict] = []
+        async for doc in admin_find(collection, params).batch_size(500):
+            if not expand:
+                yield line(doc)
+                continue
+            # Expande em blocos para ler serp_entries uma vez a cada 100 buscas
+            chunk.append(doc)
+            if len(chunk) == 100:
+                for expanded in await expand_search_documents(chunk):
+                    yield line(expanded)
+                chunk = []
+        for expanded in await expand_search_documents(chunk):
+            yield line(expanded)
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    headers = {"Content-Disposition": f'attachment; filename="{collection}.{format}"'}
+    return StreamingResponse(rows(), media_type=media_type, headers=headers)
 
 @app.post("/api/admin/add-credits")
 async def add_credits_to_user(data: dict):
-    result = await db.users.update_one({"email": data.get("email")}, {"$inc": {"credits": int(data.get("credits", 0))}})
-    if result.matched_count > 0:
+    user = await update_user({"email": data.get("email")}, {"$inc": {"credits": int(data.get("credits", 0))}})
+    if user:
+        await db.credit_ledger.insert_one(ledger_entry(user["_id"], int(data.get("credits", 0)), "admin", str(uuid.uuid4())))
         return {"success": True, "message": f"{data.get('credits')} créditos adicionados"}
     raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
+@app.get("/api/admin/search-cache")
+async def get_search_cache_settings():
+    return {"ttl_seconds": search_cache.ttl, "memory_entries": len(search_cache.memory), "stored_entries": await db.search_cache.estimated_document_count()}
+
+@app.post("/api/admin/search-cache")
+async def update_search_cache_settings(data: dict):
+    ttl = int(data.get("ttl_seconds", search_cache.ttl))
+    if ttl < 0:
+        raise HTTPException(status_code=400, detail="TTL inválido")
+    await db.settings.update_one({"_id": "search_cache"}, {"$set": {"ttl_seconds": ttl}}, upsert=True)
+    search_cache.ttl = ttl
+    await ensure_indexes()
+    return {"success": True, "ttl_seconds": ttl}
+
+@app.post("/api/admin/search-cache/refresh")
+async def refresh_search_cache(data: dict):
+    """Invalida o cache de um nome/CPF; sem nome nem CPF limpa o cache inteiro"""
+    if data.get("name") or data.get("cpf"):
+        removed = await search_cache.invalidate(search_cache_key(data.get("name"), data.get("cpf")))
+    else:
+        removed = await search_cache.invalidate()
+    return {"success": True, "removed": removed}
+
+@app.get("/api/admin/serp-cache")
+async def get_serp_cache_stats():
+    return search_system.serp_cache.get_stats()
+
+@app.get("/api/admin/engine-limits")
+async def get_engine_limits():
+    return await search_system.limiter.get_stats()
+
+@app.get("/api/admin/hot-refresh")
+async def get_hot_refresh_stats():
+    return FastJSONResponse({**await hot_refresher.get_stats(), "terms": await hot_refresher.hot_terms()})
+
+@app.get("/api/admin/search-jobs")
+async def get_search_jobs_stats():
+    return await search_jobs.get_stats()
+
+@app.get("/api/admin/user-cache")
+async def get_user_cache_stats():
+    return user_cache.get_stats()
+
+@app.get("/api/admin/indexes/check")
+async def check_indexes():
+    """Lista os índices existentes e as consultas da API que não usam índice (COLLSCAN) ou ordenam em memória"""
+    report = await check_query_coverage()
+    indexes = {collection: sorted(await db[collection].index_information()) for collection in required_indexes()}
+    return {
+        "indexes": indexes,
+        "uncovered": [r["query"] for r in report if not r["covered"] or r["in_memory_sort"]],
+        "queries": report
+    }
+
+@app.get("/api/admin/ledger/check")
+async def check_ledger():
+    """Confere que toda devolução de crédito aponta para uma reserva do mesmo usuário e não a excede"""
+    problems = await check_credit_ledger()
+    return {"consistent": not problems, "problems": problems}
+
+class AppStatsCollector:
+    """Expõe no /metrics os contadores que os componentes já mantêm (lidos só no scrape)"""
+    CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+    
+    def collect(self):
+        serp = CounterMetricFamily("verificapessoa_serp_cache", "Cache de SERP por motor", labels=["engine", "event"])
+        for engine, counters in search_system.serp_cache.stats.items():
+            for event, value in counters.items():
+                serp.add_metric([engine, event], value)
+        yield serp
+        users = CounterMetricFamily("verificapessoa_user_cache", "Cache de usuários e tokens", labels=["cache", "event"])
+        for cache in ("user", "token"):
+            users.add_metric([cache, "hit"], user_cache.stats[f"{cache}_hits"])
+            users.add_metric([cache, "miss"], user_cache.stats[f"{cache}_misses"])
+        yield users
+        circuit = GaugeMetricFamily("verificapessoa_engine_circuit_state", "Circuit breaker por motor (0 fechado, 1 meio-aberto, 2 aberto)", labels=["engine"])
+        for engine, health in search_system.health.items():
+            circuit.add_metric([engine], self.CIRCUIT_STATES[health.state])
+        yield circuit
+        yield GaugeMetricFamily("verificapessoa_search_jobs_busy_workers", "Workers da fila de buscas ocupados", value=search_jobs.busy)
+        yield CounterMetricFamily("verificapessoa_password_rejected", "Logins/cadastros rejeitados com pool bcrypt saturado", value=password_hasher.rejected)
+
+REGISTRY.register(AppStatsCollector())
+
+@app.get("/metrics")
+async def metrics():
+    """Formato texto do Prometheus; com PROMETHEUS_MULTIPROC_DIR agrega os workers do processo"""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(AppStatsCollector())
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc)}
@@ -613,63 +3077,8 @@ async def root():
 
 @app.get("/api/debug/test-engines")
 async def test_all_engines():
-    """Testa os 3 motores de busca"""
-    test_query = "Silas André Bazzilli Caliari"
-    
-    results = {
-        "query": test_query,
-        "engines": {}
-    }
-    
-    # Testar DuckDuckGo
-    try:
-        url_duck = f'https://html.duckduckgo.com/html/?q={quote(test_query)}'
-        resp_duck = requests.get(url_duck, timeout=10)
-        soup_duck = BeautifulSoup(resp_duck.text, 'html.parser')
-        divs_duck = soup_duck.find_all('div', class_='result')
-        
-        results["engines"]["duckduckgo"] = {
-            "status": resp_duck.status_code,
-            "html_length": len(resp_duck.text),
-            "results_found": len(divs_duck),
-            "working": len(divs_duck) > 0
-        }
-    except Exception as e:
-        results["engines"]["duckduckgo"] = {"error": str(e)}
-    
-    # Testar Bing
-    try:
-        url_bing = f'https://www.bing.com/search?q={quote(test_query)}&count=10'
-        resp_bing = requests.get(url_bing, timeout=10)
-        soup_bing = BeautifulSoup(resp_bing.text, 'html.parser')
-        divs_bing = soup_bing.find_all('li', class_='b_algo')
-        
-        results["engines"]["bing"] = {
-            "status": resp_bing.status_code,
-            "html_length": len(resp_bing.text),
-            "results_found": len(divs_bing),
-            "working": len(divs_bing) > 0
-        }
-    except Exception as e:
-        results["engines"]["bing"] = {"error": str(e)}
-    
-    # Testar Google
-    try:
-        url_google = f'https://www.google.com/search?q={quote(test_query)}&num=10'
-        resp_google = requests.get(url_google, timeout=10)
-        soup_google = BeautifulSoup(resp_google.text, 'html.parser')
-        divs_google = soup_google.find_all('div', class_='g')
-        
-        results["engines"]["google"] = {
-            "status": resp_google.status_code,
-            "html_length": len(resp_google.text),
-            "results_found": len(divs_google),
-            "working": len(divs_google) > 0
-        }
-    except Exception as e:
-        results["engines"]["google"] = {"error": str(e)}
-    
-    return results
+    """Saúde dos 3 motores medida no tráfego real (sem requisições novas)"""
+    return {"engines": {engine.lower(): stats for engine, stats in search_system.get_engine_stats().items()}}
 
 if __name__ == "__main__":
     import uvicorn
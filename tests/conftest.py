@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import pytest
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Banco em memória (mongomock) no lugar de server.db"""
+    from mongomock_motor import AsyncMongoMockClient
+    import server
+    database = AsyncMongoMockClient()["tests"]
+    monkeypatch.setattr(server, "db", database)
+    return database
@@ -0,0 +1,19 @@
+"""AnalysisPipeline: métricas de estágio"""
+from prometheus_client import REGISTRY
+
+import server
+
+RESULTS = [
+    {"engine": "Bing", "title": "João Carlos da Silva - Jusbrasil", "snippet": "Processo 1002345-67.2021.8.26.0100 no TJSP", "url": "https://www.jusbrasil.com.br/nomes/joao"},
+    {"engine": "Google", "title": "João Carlos da Silva | LinkedIn", "snippet": "Sócio da Construtora Horizonte Ltda", "url": "https://br.linkedin.com/in/joao"},
+]
+
+def observations() -> float:
+    return REGISTRY.get_sample_value("verificapessoa_stage_seconds_count", {"stage": "analysis", "target": "total"}) or 0.0
+
+def test_run_without_metrics_leaves_stage_seconds_untouched():
+    before = observations()
+    preview = server.analysis_pipeline.run(RESULTS, record_metrics=False)
+    assert observations() == before
+    assert server.analysis_pipeline.run(RESULTS) == preview
+    assert observations() == before + 1
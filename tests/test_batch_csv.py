@@ -0,0 +1,28 @@
+"""parse_batch_csv: cabeçalhos e entradas"""
+import pytest
+
+import server
+
+@pytest.mark.parametrize("text, expected", [
+    ("nome;cpf\nJoão Silva;123.456.789-09\n", [("João Silva;123.456.789-09", "João Silva", "123.456.789-09")]),
+    ("Nome Completo\nJoão Silva\nMaria Souza\n", [("João Silva", "João Silva", None), ("Maria Souza", "Maria Souza", None)]),
+    ("Nome do cliente,CPF/CNPJ\nJoão Silva,12345678909\n", [("João Silva,12345678909", "João Silva", "12345678909")]),
+    ("Cliente;Documento\nJoão Silva;123.456.789-09\n", [("João Silva;123.456.789-09", "João Silva", "123.456.789-09")]),
+    ("Razão social;Documento\nJoão Silva;123.456.789-09\n", [("João Silva;123.456.789-09", None, "123.456.789-09")]),
+    ("NOME\nJoão Silva\n", [("João Silva", "João Silva", None)]),
+    ("João Silva\nMaria Souza\n", [("João Silva", "João Silva", None), ("Maria Souza", "Maria Souza", None)]),
+    ("João Silva\n", [("João Silva", "João Silva", None)]),
+    ("", []),
+])
+def test_parse_batch_csv(text, expected):
+    assert server.parse_batch_csv(text) == expected
+
+@pytest.mark.parametrize("text", [
+    "Cliente,Cidade\nJoão Silva,Campinas\nMaria Souza,Santos\n",
+    "Nome Completo\nJoão Silva\nMaria Souza\n",
+    "Nomes\nJoão Silva\nMaria Souza\n",
+    "Buscar,Idade\nJoão Silva,34\nMaria Souza,41\n",
+])
+def test_header_like_first_row_is_never_billed(text):
+    entries = server.parse_batch_csv(text)
+    assert [name for _, name, _ in entries] == ["João Silva", "Maria Souza"]
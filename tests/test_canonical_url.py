@@ -0,0 +1,23 @@
+"""canonical_url / url_dedup_key"""
+import base64
+
+import pytest
+
+import server
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://WWW.Example.com.:443/a?utm_source=x&id=1&fbclid=y#frag", "https://www.example.com/a?id=1"),
+    ("//duckduckgo.com/l/?uddg=https%3A%2F%2Fexample.com%2Fp%3Fq%3D1&rut=abc", "https://example.com/p?q=1"),
+    ("/url?q=https://example.com/x%3Fa%3D1%26b%3D2&sa=U&usg=z", "https://example.com/x?a=1&b=2"),
+    ("https://www.bing.com/ck/a?!&&p=1&u=a1" + base64.urlsafe_b64encode(b"https://example.com/b").decode().rstrip("=") + "&ntb=1", "https://example.com/b"),
+    ("http://example.com:8080", "http://example.com:8080/"),
+    ("http://[2001:db8::1]/path", "http://[2001:db8::1]/path"),
+    ("https://[2001:DB8::1]:8443/p?utm_medium=a", "https://[2001:db8::1]:8443/p"),
+    ("http://[::1]:80/", "http://[::1]/"),
+    ("mailto:a@b.com", "mailto:a@b.com"),
+])
+def test_canonical_url(url, expected):
+    assert server.canonical_url(url) == expected
+
+def test_ipv6_dedup_key_keeps_brackets():
+    assert server.url_dedup_key(server.canonical_url("https://[2001:db8::1]/a/")) == "[2001:db8::1]/a"
@@ -0,0 +1,62 @@
+"""Reservas e devoluções de crédito (credit_ledger) sobre mongomock"""
+import asyncio
+
+import server
+
+USER = {"_id": "user-1", "email": "a@b.com"}
+
+async def setup_user(db, credits: int):
+    await db.users.insert_one({**USER, "credits": credits})
+
+def test_batch_job_failures_refund_against_the_batch_reservation(db):
+    queue = server.SearchJobQueue(1)
+
+    async def scenario():
+        await setup_user(db, 5)
+        await server.reserve_credit(USER["_id"], "batch-1", 3)
+        job_ids = await queue.enqueue_batch("batch-1", USER, [("Ana", None), ("Bia", None), (None, "12345678909")], False)
+        jobs = [await db.search_jobs.find_one({"_id": job_id}) for job_id in job_ids]
+        await queue.fail(jobs[0], "erro")
+        await queue.fail(jobs[1], "erro")
+        await queue.fail(jobs[1], "erro")
+        refunds = await db.credit_ledger.find({"kind": "refund"}).to_list(None)
+        return jobs, refunds, await db.users.find_one({"_id": USER["_id"]}), await server.check_credit_ledger()
+
+    jobs, refunds, user, problems = asyncio.run(scenario())
+    assert all(job["reservation"] == "batch-1" for job in jobs)
+    assert sorted((r["ref"], r["part"], r["delta"]) for r in refunds) == sorted(("batch-1", job["_id"], 1) for job in jobs[:2])
+    assert user["credits"] == 5 - 3 + 2
+    assert problems == []
+
+def test_single_job_failure_refunds_its_own_reservation(db):
+    queue = server.SearchJobQueue(1)
+    job = queue.job_document("job-1", USER, "Ana", None, False)
+
+    async def scenario():
+        await setup_user(db, 1)
+        await server.reserve_credit(USER["_id"], job["_id"])
+        await db.search_jobs.insert_one(job)
+        await queue.fail(job, "erro")
+        return await db.credit_ledger.find_one({"kind": "refund"}), await server.check_credit_ledger()
+
+    refund, problems = asyncio.run(scenario())
+    assert refund["_id"] == "refund:job-1" and refund["ref"] == "job-1"
+    assert problems == []
+
+def test_check_reports_refunds_without_matching_reservation(db):
+    async def scenario():
+        await setup_user(db, 10)
+        await server.reserve_credit(USER["_id"], "batch-2", 2)
+        for part in ("a", "b", "c"):
+            await server.refund_credit(USER["_id"], "batch-2", part=part)
+        # Formato anterior: job de lote devolvido com o próprio id, que nunca foi reservado
+        await server.refund_credit(USER["_id"], "job-orfao")
+        await db.credit_ledger.insert_one(server.ledger_entry("user-2", 1, "refund", "batch-3"))
+        await server.reserve_credit(USER["_id"], "batch-3")
+        return {p["ref"]: p["problem"] for p in await server.check_credit_ledger()}
+
+    assert asyncio.run(scenario()) == {
+        "batch-2": "devolução acima do reservado",
+        "job-orfao": "devolução sem reserva",
+        "batch-3": "devolução para outro usuário",
+    }
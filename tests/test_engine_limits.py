@@ -0,0 +1,142 @@
+"""Limites por motor compartilhados entre processos (MongoEngineLimiter).
+
+Os workers são processos de verdade (spawn), cada um com seu MongoEngineLimiter, todos apontando para
+o mesmo armazenamento: uma coleção mongomock servida por um multiprocessing manager, com um lock que
+torna cada operação atômica como no Mongo. Assim o teste roda sem MongoDB e exercita exatamente as
+atualizações condicionais (GCRA em 'tat' e vagas em 'leases') que o limiter faz em produção.
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+import pytest
+
+ENGINE = "Bing"
+RATE = 20.0
+BURST = 3
+CONCURRENCY = 2
+HOLD_SECONDS = 0.03
+
+
+class SharedEngineLimits:
+    """Coleção engine_limits em memória, uma operação por vez (subconjunto da API usado pelo limiter)"""
+
+    def __init__(self):
+        import mongomock
+        self.collection = mongomock.MongoClient()["tests"]["engine_limits"]
+        self.lock = threading.Lock()
+
+    def find_one_and_update(self, *args, **kwargs):
+        with self.lock:
+            return self.collection.find_one_and_update(*args, **kwargs)
+
+    def update_one(self, *args, **kwargs):
+        with self.lock:
+            self.collection.update_one(*args, **kwargs)
+
+    def find_one(self, *args, **kwargs):
+        with self.lock:
+            return self.collection.find_one(*args, **kwargs)
+
+
+class LimitsManager(BaseManager):
+    pass
+
+
+LimitsManager.register("SharedEngineLimits", SharedEngineLimits)
+
+
+class AsyncCollection:
+    """Interface assíncrona (como a do motor) sobre o proxy do manager"""
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return await asyncio.to_thread(self.proxy.find_one_and_update, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await asyncio.to_thread(self.proxy.update_one, *args, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        return await asyncio.to_thread(self.proxy.find_one, *args, **kwargs)
+
+
+def worker_main(proxy, start_at: float, requests: int, tasks: int, results):
+    import server
+
+    limiter = server.MongoEngineLimiter((ENGINE,), RATE, BURST, CONCURRENCY, lease_seconds=10, collection=AsyncCollection(proxy))
+    slots = []
+
+    async def fetch():
+        async with limiter.slot(ENGINE):
+            start = time.time()
+            await asyncio.sleep(HOLD_SECONDS)
+            slots.append((start, time.time()))
+
+    async def run():
+        await limiter.setup()
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        queue = list(range(requests))
+
+        async def loop():
+            while queue:
+                queue.pop()
+                await fetch()
+
+        await asyncio.gather(*(loop() for _ in range(tasks)))
+
+    asyncio.run(run())
+    results.put((slots, limiter.degraded))
+
+
+def max_in_window(starts, window: float) -> int:
+    starts = sorted(starts)
+    best, first = 0, 0
+    for last, start in enumerate(starts):
+        while start - starts[first] > window:
+            first += 1
+        best = max(best, last - first + 1)
+    return best
+
+
+def peak_overlap(slots) -> int:
+    events = sorted([(start, 1) for start, _ in slots] + [(end, -1) for _, end in slots])
+    active = peak = 0
+    for _, delta in events:
+        active += delta
+        peak = max(peak, active)
+    return peak
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_limits_hold_across_processes(workers):
+    context = multiprocessing.get_context("spawn")
+    requests_per_worker = 24 // workers
+    with LimitsManager(ctx=context) as manager:
+        store = manager.SharedEngineLimits()
+        results = context.Queue()
+        start_at = time.time() + 2 + 0.5 * workers
+        processes = [context.Process(target=worker_main, args=(store, start_at, requests_per_worker, 4, results)) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join(timeout=30)
+            assert process.exitcode == 0
+
+    slots = [slot for worker_slots, _ in outcomes for slot in worker_slots]
+    starts = [start for start, _ in slots]
+    assert not any(degraded for _, degraded in outcomes)
+    assert len(slots) == requests_per_worker * workers
+
+    # GCRA: em qualquer janela de W segundos passam no máximo BURST + RATE * W requisições,
+    # somando todos os processos (o limite local permitiria isso por processo)
+    for window in (0.25, 0.5, 1.0):
+        assert max_in_window(starts, window) <= BURST + RATE * window + 1, window
+    elapsed = max(starts) - min(starts)
+    assert (len(starts) - BURST) / elapsed <= RATE * 1.1
+
+    assert peak_overlap(slots) <= CONCURRENCY
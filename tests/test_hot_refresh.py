@@ -0,0 +1,41 @@
+"""HotSearchRefresher: termos agrupados pela chave do cache e ociosidade vista por todos os workers"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import server
+
+RESULTS = {"name": "Joao Silva", "completeness": {"timed_out": False, "answered": True}}
+
+def make_refresher(idle_seconds: float = 60) -> server.HotSearchRefresher:
+    refresher = server.HotSearchRefresher(top=10, min_searches=1, window_days=7, interval=60, idle_seconds=idle_seconds,
+                                          budget_per_hour=100, stale_fraction=0.5)
+    refresher.last_activity = time.monotonic() - idle_seconds
+    return refresher
+
+def test_hot_terms_group_by_cache_key(db):
+    async def scenario():
+        await server.record_search("a@x.com", "Joao Silva", None, RESULTS)
+        await server.record_search("b@x.com", "João  Silva", None, RESULTS)
+        await server.record_search("c@x.com", "Joao Silva", "123.456.789-09", RESULTS)
+        return await make_refresher().hot_terms()
+
+    terms = {term["key"]: term for term in asyncio.run(scenario())}
+    assert terms["name:joao silva"]["searches"] == 2
+    assert terms["cpf:12345678909|name:joao silva"]["searches"] == 1
+    assert terms["cpf:12345678909|name:joao silva"]["cpf"] == "123.456.789-09"
+
+def test_idle_sees_other_workers(db):
+    refresher = make_refresher()
+
+    async def scenario():
+        quiet = await refresher.idle()
+        await db.search_jobs.insert_one({"_id": "job", "status": "running"})
+        running_job = await refresher.idle()
+        await db.search_jobs.delete_one({"_id": "job"})
+        await db.searches.insert_one({"_id": "recent", "search_name": "Joao Silva", "created_at": datetime.now(timezone.utc)})
+        recent_search = await refresher.idle()
+        await db.searches.update_one({"_id": "recent"}, {"$set": {"created_at": datetime.now(timezone.utc) - timedelta(minutes=5)}})
+        return quiet, running_job, recent_search, await refresher.idle()
+
+    assert asyncio.run(scenario()) == (True, False, False, True)
@@ -0,0 +1,39 @@
+"""ensure_indexes: comparação das definições existentes com required_indexes()"""
+import asyncio
+
+import server
+
+def test_index_key_normalizes_directions():
+    assert server._index_key([("created_at", -1.0), ("_id", 1)]) == [("created_at", -1), ("_id", 1)]
+    assert server._index_key({"name": "text", "priority": 1.0}) == [("name", "text"), ("priority", 1)]
+
+def test_mapping_keys_are_not_rebuilt(db, monkeypatch):
+    """Índices reportados com a chave como mapeamento e direções float (1.0/-1.0) são os mesmos: nada é removido ou recriado"""
+    asyncio.run(server.ensure_indexes())
+    reported = {}
+
+    async def scenario():
+        for collection in server.required_indexes():
+            info = await db[collection].index_information()
+            reported[collection] = {name: {**spec, "key": {field: float(direction) if isinstance(direction, int) else direction
+                                                           for field, direction in spec["key"]}}
+                                    for name, spec in info.items()}
+        dropped, created = [], []
+
+        async def index_information(self):
+            return reported[self.name]
+
+        async def drop_index(self, name):
+            dropped.append(name)
+
+        async def create_indexes(self, models):
+            created.extend(model.document["name"] for model in models)
+
+        collection_class = type(db.users)
+        monkeypatch.setattr(collection_class, "index_information", index_information)
+        monkeypatch.setattr(collection_class, "drop_index", drop_index)
+        monkeypatch.setattr(collection_class, "create_indexes", create_indexes)
+        await server.ensure_indexes()
+        return dropped, created
+
+    assert asyncio.run(scenario()) == ([], [])
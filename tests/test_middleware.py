@@ -0,0 +1,25 @@
+"""Middlewares ASGI do app: métricas por requisição"""
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import server
+
+def requests_observed(method: str, route: str, status: str) -> float:
+    labels = {"method": method, "route": route, "status": status}
+    return REGISTRY.get_sample_value("verificapessoa_http_request_seconds_count", labels) or 0.0
+
+def test_request_metrics_use_declared_route_and_status():
+    client = TestClient(server.app)
+    before = {key: requests_observed(*key) for key in [("GET", "/api/health", "200"), ("GET", "/api/search/{job_id}", "401"), ("GET", "unmatched", "404")]}
+    assert client.get("/api/health").status_code == 200
+    assert client.get("/api/search/abc").status_code == 401
+    assert client.get("/nao-existe").status_code == 404
+    for key, count in before.items():
+        assert requests_observed(*key) == count + 1, key
+
+def test_request_metrics_with_compression():
+    client = TestClient(server.app)
+    before = requests_observed("GET", "/metrics", "200")
+    response = client.get("/metrics", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert requests_observed("GET", "/metrics", "200") == before + 1
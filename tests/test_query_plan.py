@@ -0,0 +1,72 @@
+"""QueryPlan: regra de nome raro e cache de resultados sem resposta dos motores"""
+import asyncio
+
+import pytest
+
+import server
+
+def run_base(plan: server.QueryPlan, engines: dict, results: int = 0):
+    """Executa a query base com o desfecho de cada motor dado"""
+    base = plan.next_wave({}, lambda query: 2)[0]
+    assert base["template"] == "base"
+    base["engines"] = {engine: {"status": status} for engine, status in engines.items()}
+    plan.record(base, [{}] * results)
+    return base
+
+def test_rare_name_when_engines_answered_empty():
+    plan = server.QueryPlan("Xyzzy Qwerty", budget=0, section_target=0, rare_results=1, deadline=0)
+    run_base(plan, {"DuckDuckGo": "empty", "Bing": "failed", "Google": "empty"})
+    assert plan.next_wave({}, lambda query: 2) == []
+    assert {step["reason"] for step in plan.steps[1:]} == {"nome raro"}
+    completeness = plan.completeness()
+    assert completeness["answered"] is True
+    assert server.cacheable({"completeness": completeness})
+
+@pytest.mark.parametrize("outcome", ["failed", "timed_out"])
+def test_plan_continues_when_no_engine_answered(outcome):
+    plan = server.QueryPlan("Joao Silva", budget=0, section_target=0, wave_size=3, rare_results=1, deadline=0)
+    run_base(plan, {"DuckDuckGo": outcome, "Bing": outcome, "Google": outcome})
+    wave = plan.next_wave({}, lambda query: 2)
+    assert [step["template"] for step in wave] == ["brasil", "processos", "empresas"]
+    assert not any(step.get("reason") == "nome raro" for step in plan.steps)
+
+def test_result_without_any_engine_answer_is_not_cached():
+    plan = server.QueryPlan("Joao Silva", budget=0, section_target=0, wave_size=10, rare_results=1, deadline=0)
+    run_base(plan, {"DuckDuckGo": "failed", "Bing": "failed", "Google": "failed"})
+    for step in plan.next_wave({}, lambda query: 2):
+        step["engines"] = {"DuckDuckGo": {"status": "failed"}, "Bing": {"status": "failed"}}
+        plan.record(step, [])
+    completeness = plan.completeness()
+    assert completeness["answered"] is False and completeness["complete"] is False
+    assert not server.cacheable({"completeness": completeness})
+
+def test_execute_search_skips_cache_when_nothing_answered(db, monkeypatch):
+    calls = []
+
+    async def fake_search_person(name=None, cpf=None, on_batch=None):
+        calls.append(name)
+        return {"name": name, "timestamp": "2026-01-01T00:00:00+00:00",
+                "completeness": {"timed_out": False, "answered": len(calls) > 1}}
+
+    monkeypatch.setattr(server.search_system, "search_person", fake_search_person)
+    monkeypatch.setattr(server, "search_cache", server.SearchResultCache(60, 10))
+
+    async def scenario():
+        first = await server.execute_search("Joao Silva", None)
+        second = await server.execute_search("Joao Silva", None)
+        third = await server.execute_search("Joao Silva", None)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert [first["cache"]["hit"], second["cache"]["hit"], third["cache"]["hit"]] == [False, False, True]
+    assert len(calls) == 2
+
+def test_google_fallback_stays_within_budget():
+    plan = server.QueryPlan("Joao Silva", budget=14, section_target=0, wave_size=3, rare_results=0, deadline=0)
+    while wave := plan.next_wave({}, lambda query: 2, lambda query: 1):
+        for step in wave:
+            step["requests"] = 2 + step["fallback"]
+            step["engines"] = {"DuckDuckGo": {"status": "empty"}, "Bing": {"status": "empty"}}
+            plan.record(step, [])
+    assert plan.requests <= 14
+    assert any(step.get("fallback") is False for step in plan.steps)
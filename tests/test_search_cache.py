@@ -0,0 +1,25 @@
+"""SearchResultCache: invalidação e TTL compartilhados entre workers via db.settings"""
+import asyncio
+
+import server
+
+def test_invalidation_reaches_other_workers(db):
+    async def scenario():
+        first, second = server.SearchResultCache(60, 10, sync_interval=0), server.SearchResultCache(60, 10, sync_interval=0)
+        await first.set("joao silva", {"name": "Joao Silva"})
+        assert await second.get("joao silva") is not None
+        await first.invalidate("joao silva")
+        return await second.get("joao silva"), len(second.memory)
+
+    cached, entries = asyncio.run(scenario())
+    assert cached is None and entries == 0
+
+def test_ttl_change_reaches_other_workers(db):
+    async def scenario():
+        worker = server.SearchResultCache(60, 10, sync_interval=0)
+        await worker.set("joao silva", {"name": "Joao Silva"})
+        await db.settings.update_one({"_id": "search_cache"}, {"$set": {"ttl_seconds": 0}}, upsert=True)
+        return await worker.get("joao silva"), worker.ttl
+
+    cached, ttl = asyncio.run(scenario())
+    assert cached is None and ttl == 0
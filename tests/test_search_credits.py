@@ -0,0 +1,46 @@
+"""POST /api/search: o crédito reservado volta quando a busca não é entregue nem enfileirada"""
+import asyncio
+
+import pytest
+from pymongo.errors import PyMongoError
+
+import server
+
+USER = {"_id": "user-1", "email": "a@b.com"}
+
+async def call_search(db, **request):
+    await db.users.insert_one({**USER, "credits": 1})
+    await server.search_person(server.SearchRequest(name="Joao Silva", **request), None, USER)
+
+def test_failed_enqueue_refunds(db, monkeypatch):
+    async def broken_enqueue(*args, **kwargs):
+        raise PyMongoError("insert falhou")
+    monkeypatch.setattr(server.search_jobs, "enqueue", broken_enqueue)
+    credits = {}
+
+    async def scenario():
+        with pytest.raises(PyMongoError):
+            await call_search(db, async_job=True)
+        credits["after"] = (await db.users.find_one({"_id": USER["_id"]}))["credits"]
+
+    asyncio.run(scenario())
+    assert credits["after"] == 1
+
+def test_failed_record_refunds(db, monkeypatch):
+    async def fake_execute_search(name, cpf, force_refresh=False, on_batch=None):
+        return {"name": name, "completeness": {"timed_out": False, "answered": True}}
+
+    async def broken_record(*args, **kwargs):
+        raise PyMongoError("searches indisponível")
+    monkeypatch.setattr(server, "execute_search", fake_execute_search)
+    monkeypatch.setattr(server, "record_search", broken_record)
+    credits = {}
+
+    async def scenario():
+        with pytest.raises(PyMongoError):
+            await call_search(db)
+        credits["after"] = (await db.users.find_one({"_id": USER["_id"]}))["credits"]
+        credits["refunds"] = await db.credit_ledger.count_documents({"kind": "refund"})
+
+    asyncio.run(scenario())
+    assert credits == {"after": 1, "refunds": 1}
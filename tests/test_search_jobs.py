@@ -0,0 +1,54 @@
+"""Fila de buscas (SearchJobQueue) sobre mongomock"""
+import asyncio
+from types import SimpleNamespace
+
+import server
+
+RESULTS = {"name": "João", "cpf": None, "timestamp": "2026-01-01T00:00:00+00:00", "public_records": [],
+           "query_plan": {"requests": 1}, "completeness": {"timed_out": False}}
+
+def make_job(queue, job_id="job-1"):
+    user = {"_id": "user-1", "email": "a@b.com"}
+    return queue.job_document(job_id, user, "João", None, False)
+
+def test_retry_after_crash_between_record_and_done(db, monkeypatch):
+    """Crash entre record_search e o status done: a retentativa não pode falhar com _id duplicado"""
+    async def fake_execute_search(name, cpf, force_refresh=False, on_batch=None):
+        return RESULTS
+    monkeypatch.setattr(server, "execute_search", fake_execute_search)
+    queue = server.SearchJobQueue(1)
+    job = make_job(queue)
+
+    async def scenario():
+        await db.search_jobs.insert_one({**job, "status": "running", "attempts": 1})
+        await server.record_search(job["user_email"], job["name"], job["cpf"], RESULTS, search_id=job["_id"])
+        await queue.process(job)
+        return (await db.search_jobs.find_one({"_id": job["_id"]}), await db.searches.count_documents({}),
+                await db.stats.find_one({"_id": "totals"}), await db.credit_ledger.count_documents({"kind": "refund"}))
+
+    stored, searches, totals, refunds = asyncio.run(scenario())
+    assert stored["status"] == "done"
+    assert stored["results"] == RESULTS
+    assert searches == 1
+    assert totals["searches"] == 1
+    assert refunds == 0
+
+def test_heartbeat_survives_mongo_error(monkeypatch):
+    monkeypatch.setattr(server, "SEARCH_JOB_HEARTBEAT", 0.01)
+    calls = []
+
+    async def flaky_update(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise server.PyMongoError("primário indisponível")
+    monkeypatch.setattr(server, "db", SimpleNamespace(search_jobs=SimpleNamespace(update_one=flaky_update)))
+
+    async def scenario():
+        heartbeat = asyncio.create_task(server.SearchJobQueue(1)._heartbeat("job-1"))
+        await asyncio.sleep(0.1)
+        alive = not heartbeat.done()
+        heartbeat.cancel()
+        return alive
+
+    assert asyncio.run(scenario())
+    assert len(calls) > 1
@@ -0,0 +1,51 @@
+"""Parsers de SERP contra páginas gravadas de cada motor (tests/fixtures/serp)"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import server
+from conftest import FIXTURES
+
+SERP_DIR = FIXTURES / "serp"
+EXPECTED = json.loads((SERP_DIR / "expected.json").read_text(encoding="utf-8"))
+ENGINES = {"duckduckgo": "DuckDuckGo", "bing": "Bing", "google": "Google"}
+
+def page(name: str) -> str:
+    return (SERP_DIR / name).read_text(encoding="utf-8")
+
+def parse_with_health(engine: str, name: str):
+    """MultiSearchEngine.parse sobre a página gravada; devolve (resultados, último outcome de saúde)"""
+    search = server.MultiSearchEngine()
+    response = httpx.Response(200, text=page(name))
+    results = asyncio.run(search.parse(engine, response))
+    return results, search.health[engine].outcomes[-1]
+
+@pytest.mark.parametrize("name", sorted(n for n in EXPECTED if EXPECTED[n]))
+def test_parser_matches_recorded_page(name):
+    engine = ENGINES[name.split("-")[0]]
+    results = server.SERP_PARSERS[engine](page(name))
+    assert results == EXPECTED[name]
+    assert all(set(r) == {"engine", "title", "snippet", "url"} for r in results)
+    assert all(r["title"] and r["snippet"] and r["url"].startswith(("http://", "https://")) for r in results)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_empty_page(engine):
+    assert server.SERP_PARSERS[ENGINES[engine]](page(f"empty-{engine}.html")) == []
+    assert parse_with_health(ENGINES[engine], f"empty-{engine}.html") == ([], "empty")
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_blocked_page(engine):
+    assert server.SERP_PARSERS[ENGINES[engine]](page(f"blocked-{engine}.html")) == []
+    assert parse_with_health(ENGINES[engine], f"blocked-{engine}.html") == ([], "blocked")
+
+def test_results_page_records_ok():
+    results, outcome = parse_with_health("Bing", "bing-joao-silva.html")
+    assert results == EXPECTED["bing-joao-silva.html"]
+    assert outcome == "ok"
+
+def test_redirects_and_tracking_are_unwrapped():
+    urls = [r["url"] for r in EXPECTED["google-joao-silva.html"]]
+    assert "https://esaj.tjsp.jus.br/cpopg/show.do?processo.codigo=1A0B2C3D" in urls
+    assert not any("duckduckgo.com/l/" in r["url"] or "bing.com/ck/a" in r["url"] for n in EXPECTED for r in EXPECTED[n])
@@ -0,0 +1,32 @@
+"""Contadores de db.stats: rebuild a partir das coleções de origem"""
+import asyncio
+from datetime import datetime, timezone
+
+import server
+
+async def seed(db):
+    await db.users.insert_many([{"_id": f"u{i}", "email": f"{i}@x.com", "created_at": datetime(2026, 1, 1 + i, tzinfo=timezone.utc)} for i in range(2)])
+    await db.searches.insert_one({"_id": "s1", "user_email": "0@x.com", "created_at": datetime(2026, 1, 2, tzinfo=timezone.utc)})
+
+def test_rebuild_survives_concurrent_bump_and_drops_stale_days(db):
+    async def scenario():
+        await seed(db)
+        await db.stats.insert_one({"_id": "daily:1999-01-01", "date": "1999-01-01", "users": 7})
+        # bump_stats de outro worker entre a agregação e a escrita: os documentos já existem
+        await server.bump_stats(searches=1)
+        totals = await server.rebuild_stats()
+        return totals, {doc["_id"]: doc async for doc in db.stats.find()}
+
+    totals, stats = asyncio.run(scenario())
+    assert totals["users"] == 2 and totals["searches"] == 1
+    assert stats["totals"]["users"] == 2
+    assert stats["daily:2026-01-01"]["users"] == 1
+    assert stats["daily:2026-01-02"] == {"_id": "daily:2026-01-02", "date": "2026-01-02", "users": 1, "searches": 1}
+    assert "daily:1999-01-01" not in stats
+    assert not any(key.startswith("daily:") and key not in ("daily:2026-01-01", "daily:2026-01-02") for key in stats)
+
+def test_startup_rebuild_runs_in_a_single_process(db):
+    async def scenario():
+        return await asyncio.gather(*(server.take_lease("stats_rebuild", f"worker-{i}", 300) for i in range(3)))
+
+    assert sorted(asyncio.run(scenario())) == [False, False, True]
@@ -0,0 +1,79 @@
+"""Migra db.searches para o formato compacto (results_format 2).
+
+Cada documento antigo tem suas entradas de SERP gravadas em serp_entries e os
+results trocados por referências. Antes de gravar, o documento é expandido de
+volta e comparado com o original; se diferir, fica no formato antigo e é
+contado como divergente. Pode ser executado de novo com segurança: documentos
+já migrados são ignorados.
+
+Uso: python -m tools.migrate_searches [--batch 200] [--dry-run]
+"""
+import argparse
+import asyncio
+
+from bson import BSON
+
+import server
+from server import (RESULTS_FORMAT_COMPACT, compact_search_results, create_mongo_client,
+                    expand_search_results, store_serp_entries)
+
+
+async def migrate(batch: int, dry_run: bool):
+    client = create_mongo_client()
+    server.db = db = client[server.DB_NAME]
+    migrated = mismatched = 0
+    size_before = size_after = 0
+    entries_seen = set()
+    entries_size = 0
+    last_id = None
+    try:
+        while True:
+            query = {"results_format": {"$ne": RESULTS_FORMAT_COMPACT}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            docs = await db.searches.find(query).sort("_id", 1).limit(batch).to_list(batch)
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+            for doc in docs:
+                results = doc.get("results")
+                if not isinstance(results, dict):
+                    continue
+                compact, entries = compact_search_results(results)
+                if expand_search_results(compact, entries) != results:
+                    mismatched += 1
+                    continue
+                new_entries = {k: v for k, v in entries.items() if k not in entries_seen}
+                entries_seen.update(new_entries)
+                entries_size += sum(len(BSON.encode(v)) for v in new_entries.values())
+                size_before += len(BSON.encode({"results": results}))
+                size_after += len(BSON.encode({"results": compact, "results_format": RESULTS_FORMAT_COMPACT}))
+                migrated += 1
+                if dry_run:
+                    continue
+                await store_serp_entries(entries)
+                await db.searches.update_one(
+                    {"_id": doc["_id"], "results_format": {"$ne": RESULTS_FORMAT_COMPACT}},
+                    {"$set": {"results": compact, "results_format": RESULTS_FORMAT_COMPACT}}
+                )
+            print(f"... {migrated} migradas, {mismatched} divergentes")
+    finally:
+        client.close()
+
+    mode = "simulação" if dry_run else "migração"
+    print(f"{mode} concluída: {migrated} buscas, {mismatched} divergentes (mantidas no formato antigo)")
+    print(f"results antes: {size_before / 1024:.1f} KiB")
+    # Tamanho das entradas sem compressão do snippet: estimativa conservadora
+    print(f"results depois: {size_after / 1024:.1f} KiB + {len(entries_seen)} entradas ({entries_size / 1024:.1f} KiB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()